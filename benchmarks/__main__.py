@@ -0,0 +1,2 @@
+import benchmarks.suite
+benchmarks.suite.main()
@@ -0,0 +1,194 @@
+from __future__ import print_function
+from netcdf import netcdf as nc
+from netCDF4 import Dataset
+from datetime import datetime
+from time import time
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import platform
+import shutil
+import json
+import sys
+import os
+
+
+def create_file(filename, step, grid, vtype, format):
+    ref = Dataset(filename, mode='w', clobber=True, format=format)
+    ref.createDimension('xc', grid[1])
+    ref.createDimension('yc', grid[0])
+    ref.createDimension('time')
+    var = ref.createVariable('time', 'i4', dimensions=('time',), zlib=True,
+                             fill_value=0)
+    var[0] = step
+    for name in ['lat', 'lon']:
+        var = ref.createVariable(name, 'f4', dimensions=('yc', 'xc'),
+                                 zlib=True, fill_value=0.0)
+        var[:] = np.random.rand(*grid)
+    var = ref.createVariable('data', vtype, dimensions=('time', 'yc', 'xc'),
+                             zlib=True, fill_value=0)
+    var[:] = (np.random.rand(1, *grid) * 100).astype(vtype)
+    ref.close()
+
+
+def create_package(path, files, grid, vtype, format):
+    filenames = [os.path.join(path, 'bench%s.nc' % str(i).zfill(5))
+                 for i in range(files)]
+    for step, filename in enumerate(filenames):
+        create_file(filename, step, grid, vtype, format)
+    return os.path.join(path, 'bench*.nc')
+
+
+class Case(object):
+    """
+    A benchmark over a package, where setup and teardown aren't measured.
+    """
+
+    def __init__(self, name, run, setup=None, teardown=None):
+        self.name = name
+        self.run = run
+        self.setup = setup if setup else (lambda pattern, path: None)
+        self.teardown = teardown if teardown else (lambda context: None)
+
+    def measure(self, pattern, path, repeat):
+        times = []
+        for _ in range(repeat):
+            context = self.setup(pattern, path)
+            begin = time()
+            self.run(context if context is not None else pattern)
+            times.append(time() - begin)
+            self.teardown(context)
+        return {'case': self.name,
+                'best': min(times),
+                'mean': sum(times) / len(times),
+                'times': times}
+
+
+def open_root(pattern, path):
+    root = nc.open(pattern)[0]
+    return root, nc.getvar(root, 'data')
+
+
+def open_root_readers(pattern, path):
+    root = nc.open(pattern, read_only=True, readers=4)[0]
+    return root, nc.getvar(root, 'data')
+
+
+def close_root(context):
+    nc.close(context[0])
+
+
+def open_tile(pattern, path):
+    root = nc.open(pattern)[0]
+    shape = nc.getvar(root, 'data').shape
+    dims = {'yc': [shape[1] // 4, -shape[1] // 4],
+            'xc': [shape[2] // 4, -shape[2] // 4]}
+    t_root = nc.tailor(root, dimensions=dims)
+    return t_root, nc.getvar(t_root, 'data')
+
+
+def open_copy(pattern, path):
+    root, data = open_root(pattern, path)
+    filename = os.path.join(path, 'copy.nc')
+    if os.path.isfile(filename):
+        os.remove(filename)
+    return root, data, nc.open(filename)[0]
+
+
+def close_copy(context):
+    nc.close(context[2])
+    close_root(context)
+
+
+def middle(data):
+    return data.shape[0] // 2
+
+
+CASES = [
+    Case('open', lambda pattern: nc.close(nc.open(pattern)[0])),
+    Case('read_step', lambda c: c[1][middle(c[1])], open_root, close_root),
+    Case('read_full', lambda c: c[1][:], open_root, close_root),
+    Case('read_full_readers', lambda c: c[1][:], open_root_readers,
+         close_root),
+    Case('write_step', lambda c: c[1].__setitem__(middle(c[1]), 1),
+         open_root, close_root),
+    Case('copy_source', lambda c: nc.getvar(c[2], 'data', source=c[1]),
+         open_copy, close_copy),
+    Case('read_tile', lambda c: c[1][:], open_tile, close_root),
+]
+
+
+def version():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always',
+                                        '--dirty']).strip().decode()
+    except Exception:
+        return None
+
+
+def run(files, grids, vtypes, format, repeat, cases):
+    """
+    Yield the result of each case as soon as it finishes, measuring each
+    case over a fresh package (the write cases change their package).
+    """
+    for count in files:
+        for grid in grids:
+            for vtype in vtypes:
+                for case in cases:
+                    path = tempfile.mkdtemp(prefix='netcdf-bench-')
+                    try:
+                        pattern = create_package(path, count, grid, vtype,
+                                                 format)
+                        result = case.measure(pattern, path, repeat)
+                    finally:
+                        shutil.rmtree(path)
+                    result.update({'files': count,
+                                   'grid': list(grid),
+                                   'vtype': vtype,
+                                   'format': format})
+                    print('{case:18s} files={files:<6d} '
+                          'grid={grid} vtype={vtype}: '
+                          '{best:.4f}s'.format(**result), file=sys.stderr)
+                    yield result
+
+
+def save(report, filename):
+    output = open(filename, 'w') if filename else sys.stdout
+    json.dump(report, output, indent=2)
+    if filename:
+        output.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure the open, read, write, copy and tiled access '
+                    'times over synthetic packages.')
+    parser.add_argument('--files', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--grid', nargs='+', default=['100x200'],
+                        help='the spatial grid of each file, as YxX')
+    parser.add_argument('--vtype', nargs='+', default=['f4'])
+    parser.add_argument('--format', default='NETCDF4')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', nargs='+',
+                        choices=[c.name for c in CASES],
+                        default=[c.name for c in CASES])
+    parser.add_argument('--output', help='the JSON filename (default stdout)')
+    args = parser.parse_args()
+    grids = [tuple(map(int, g.split('x'))) for g in args.grid]
+    cases = [c for c in CASES if c.name in args.case]
+    report = {
+        'version': version(),
+        'date': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'results': [],
+    }
+    try:
+        for result in run(args.files, grids, args.vtype, args.format,
+                          args.repeat, cases):
+            report['results'].append(result)
+            # keep the finished cases on disk if a later one fails.
+            if args.output:
+                save(report, args.output)
+    finally:
+        save(report, args.output)
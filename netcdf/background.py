@@ -0,0 +1,176 @@
+from netcdf import open as nc_open, chunk_indexes
+from pool import NETCDF_LOCK
+from multiprocessing.pool import ThreadPool
+from threading import Event, Lock
+
+
+class Task(object):
+    """
+    The pending result of a function called by an Executor, which can be
+    waited with result() or handled by a callback when it is done.
+    """
+
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+        self.value = None
+        self.error = None
+        self.event = Event()
+        self.lock = Lock()
+        self.callbacks = []
+
+    def run(self):
+        try:
+            self.value = self.function(*self.args)
+        except Exception as error:
+            self.error = error
+        with self.lock:
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        return self.event.is_set()
+
+    def add_done_callback(self, callback):
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def result(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise Exception('The task is still running.')
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Executor(object):
+    """
+    A bounded pool of threads that runs the netCDF calls out of the thread
+    of the caller. The netCDF library isn't thread safe, so the calls hold
+    the library lock and run one at a time.
+    """
+
+    def __init__(self, workers=4):
+        self.pool = ThreadPool(workers)
+
+    def submit(self, function, *args):
+        task = Task(function, *args)
+        self.pool.apply_async(task.run)
+        return task
+
+    def locked(self, function, *args):
+        with NETCDF_LOCK:
+            return function(*args)
+
+    def shutdown(self):
+        self.pool.close()
+
+
+class BackgroundRoot(object):
+    """
+    Wrap a root descriptor to run its netCDF calls on an Executor, which
+    return Tasks instead of blocking the caller.
+    """
+
+    def __init__(self, root, executor):
+        self.root = root
+        self.executor = executor
+
+    def getvar(self, *args, **kwargs):
+        variable = self.root.getvar(*args, **kwargs)
+        # cache the blocks and the shape while the library is locked.
+        variable.offsets()
+        variable.shape
+        return BackgroundVariable(self, variable)
+
+    def getvar_task(self, *args, **kwargs):
+        return self.executor.submit(self.executor.locked,
+                                    lambda: self.getvar(*args, **kwargs))
+
+    def close_task(self):
+        task = self.executor.submit(self.executor.locked, self.root.close)
+        task.add_done_callback(lambda _: self.executor.shutdown())
+        return task
+
+    def __getattr__(self, name):
+        return getattr(self.root, name)
+
+
+class BackgroundVariable(object):
+    """
+    Wrap a variable to read it on the Executor of its root.
+    """
+
+    def __init__(self, root, variable):
+        self.root = root
+        self.variable = variable
+
+    def read(self, indexes):
+        return self.root.executor.locked(self.variable.__getitem__, indexes)
+
+    def __getitem__(self, indexes):
+        return self.read(indexes)
+
+    def read_task(self, indexes):
+        """
+        Return a Task with variable[indexes].
+        """
+        return self.root.executor.submit(self.read, indexes)
+
+    def prefetched_chunks(self, axis=0, size=1):
+        """
+        Return an iterator of (data, indexes) pairs that walks the variable,
+        reading the next chunk on the Executor while the current one is used.
+        """
+        return Chunks(self, axis, size)
+
+    def __getattr__(self, name):
+        return getattr(self.variable, name)
+
+
+class Chunks(object):
+
+    def __init__(self, variable, axis, size):
+        self.variable = variable
+        self.executor = variable.root.executor
+        # the shape is read on the Executor, holding the library lock.
+        self.indexes = self.executor.submit(self.executor.locked,
+                                            self.walk, axis, size)
+
+    def walk(self, axis, size):
+        axis = self.variable.variable.axis(axis)
+        return iter(chunk_indexes(self.variable.variable.shape[axis], axis,
+                                  size))
+
+    def request(self):
+        for index in self.indexes.result():
+            return self.executor.submit(
+                lambda: (self.variable.read(index), index))
+
+    def __iter__(self):
+        pending = self.request()
+        while pending is not None:
+            task, pending = pending, self.request()
+            yield task.result()
+
+
+def open_background(pattern, workers=4, **options):
+    """
+    Return a Task with a BackgroundRoot, that runs the netCDF calls on a
+    pool of threads so the caller isn't blocked while they are made. The
+    netCDF library isn't thread safe, so the calls hold the library lock
+    and don't run concurrently.
+
+    Keyword arguments:
+    pattern -- a list of filenames or a string pattern.
+    workers -- the amount of threads used to run the calls (default 4).
+    options -- the keyword arguments of the 'open' function.
+    """
+    executor = Executor(workers)
+    return executor.submit(executor.locked, lambda: BackgroundRoot(
+        nc_open(pattern, **options)[0], executor))
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from stats import timer
+from pool import sync_group
+from numbers import Integral
+import numpy as np
+
+
+BUFFER_BYTES = 2 ** 26
+
+
+def extent(index):
+    """
+    Return the (start, stop) pair of an unit step slice with explicit
+    bounds, or None for any other index.
+    """
+    if (isinstance(index, slice) and index.step in [None, 1] and
+            isinstance(index.start, Integral) and
+            isinstance(index.stop, Integral) and
+            0 <= index.start <= index.stop):
+        return index.start, index.stop
+    return None
+
+
+class WriteBuffer(object):
+    """
+    Keep the writes of each variable in memory, merging a hyperslab with the
+    previous write of the same variable when they are adjacent. The writes
+    are flushed in the original order, when the buffered bytes exceed the
+    limit or when it is requested (sync, close or a read of the variable).
+    """
+
+    def __init__(self, limit=BUFFER_BYTES):
+        self.limit = limit
+        self.owner = None
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def merge(self, entry, index, data):
+        previous, parts, _ = entry
+        basic = lambda k: isinstance(k, (Integral, slice))
+        if (len(previous) != len(index) or
+                not all(map(basic, previous + index))):
+            return None
+        axes = [i for i, (a, b) in enumerate(zip(previous, index)) if a != b]
+        if len(axes) != 1:
+            return None
+        axis = axes[0]
+        first, second = extent(previous[axis]), extent(index[axis])
+        if not first or not second or first[1] != second[0]:
+            return None
+        dims = [i for i, k in enumerate(index) if isinstance(k, slice)]
+        position = dims.index(axis)
+        shape = list(parts[0].shape)
+        shape[position] = second[1] - second[0]
+        if data.shape != tuple(shape):
+            return None
+        index = (previous[:axis] + (slice(first[0], second[1]),) +
+                 previous[axis + 1:])
+        return index, parts + [data], position
+
+    def add(self, variable, index, data):
+        index = index if isinstance(index, tuple) else (index,)
+        data = np.array(data, dtype=variable.dtype)
+        dims = [k for k in index if isinstance(k, slice)]
+        entries = self.entries.setdefault(variable, [])
+        merged = (self.merge(entries[-1], index, data)
+                  if entries and data.ndim == len(dims) else None)
+        if merged:
+            entries[-1] = merged
+        else:
+            entries.append((index, [data], None))
+        self.nbytes += data.nbytes
+        if self.nbytes > self.limit:
+            self.flush()
+
+    def dirty(self, variables):
+        return any([v in self.entries for v in variables])
+
+    def flush(self, variables=None):
+        """
+        Write the buffered hyperslabs (of the given netCDF variables or all
+        of them), sync their datasets and return the amount of flushed
+        variables.
+        """
+        keys = [v for v in self.entries.keys()
+                if variables is None or v in variables]
+        if not keys:
+            return 0
+        groups = OrderedDict()
+        stats = self.owner.stats if self.owner is not None else None
+        with timer(stats, 'flushes'):
+            for variable in keys:
+                for index, parts, position in self.entries.pop(variable):
+                    variable[index] = (parts[0] if len(parts) == 1
+                                       else np.concatenate(parts, position))
+                    self.nbytes -= sum([p.nbytes for p in parts])
+                group = variable.group()
+                groups[id(group)] = group
+            list(map(lambda g: sync_group(g, stats), groups.values()))
+        if self.owner is not None:
+            self.owner.invalidate()
+        return len(keys)
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from numbers import Integral
+from threading import RLock
+import numpy as np
+
+
+CACHE_BYTES = 2 ** 27
+
+
+def slab_key(indexes, shape):
+    """
+    Return a hashable description of a hyperslab, with the slices resolved
+    over the current shape (so a block isn't reused after an unlimited
+    dimension grows), or None when the indexes aren't integers or slices.
+    """
+    if len(indexes) > len(shape):
+        return None
+    indexes = indexes + (slice(None),) * (len(shape) - len(indexes))
+    key = []
+    for index, length in zip(indexes, shape):
+        if isinstance(index, slice):
+            key.append(index.indices(length))
+        elif isinstance(index, Integral) and not isinstance(index, bool):
+            key.append(int(index))
+        else:
+            return None
+    return tuple(key)
+
+
+class BlockCache(object):
+    """
+    Keep the decoded hyperslabs read from each variable, evicting the least
+    recently used ones when the cached bytes exceed the limit. A write to a
+    variable discards all its hyperslabs.
+    """
+
+    def __init__(self, limit=CACHE_BYTES):
+        self.limit = limit
+        self.blocks = OrderedDict()
+        self.keys = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.observer = None
+        self.lock = RLock()
+
+    def read(self, variable, indexes):
+        """
+        Return a copy of variable[indexes], reading it only when the
+        hyperslab isn't cached.
+        """
+        indexes = indexes if isinstance(indexes, tuple) else (indexes,)
+        slab = slab_key(indexes, variable.shape)
+        if slab is None:
+            return variable[indexes]
+        key = (variable, slab)
+        with self.lock:
+            if key in self.blocks:
+                self.hits += 1
+                self.observe('cache_hits')
+                data = self.blocks.pop(key)
+                self.blocks[key] = data
+                return data.copy()
+            self.misses += 1
+            self.observe('cache_misses')
+        data = variable[indexes]
+        self.store(variable, key, data)
+        return data
+
+    def observe(self, name):
+        if self.observer is not None:
+            self.observer.count(name)
+
+    def store(self, variable, key, data):
+        if not isinstance(data, np.ndarray) or data.nbytes > self.limit:
+            return
+        with self.lock:
+            if key in self.blocks:
+                return
+            self.blocks[key] = data.copy()
+            self.keys.setdefault(variable, set()).add(key)
+            self.nbytes += data.nbytes
+            while self.nbytes > self.limit:
+                self.remove(next(iter(self.blocks)))
+
+    def remove(self, key):
+        data = self.blocks.pop(key)
+        self.nbytes -= data.nbytes
+        keys = self.keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            self.keys.pop(key[0])
+
+    def discard(self, variable):
+        with self.lock:
+            for key in list(self.keys.get(variable, [])):
+                self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+            self.keys.clear()
+            self.nbytes = 0
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'blocks': len(self.blocks), 'bytes': self.nbytes}
+
+
+class CachedVariable(object):
+    """
+    Stand in for a netCDF4 Variable that reads through the cache.
+    """
+
+    def __init__(self, cache, variable):
+        self.cache = cache
+        self.variable = variable
+
+    def __getitem__(self, indexes):
+        return self.cache.read(self.variable, indexes)
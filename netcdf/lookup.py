@@ -0,0 +1,193 @@
+from netCDF4 import date2num
+from datetime import datetime
+from reductions import valid, fill_values
+import numpy as np
+
+
+def as_number(value, units, calendar='standard'):
+    """
+    Return a time as a number of the time variable, converting datetimes
+    with the units of the variable.
+    """
+    if not isinstance(value, datetime):
+        return value
+    if not units:
+        raise Exception('The time variable has not units to compare it '
+                        'with a datetime.')
+    return date2num(value, units, calendar)
+
+
+class TimeIndex(object):
+    """
+    The time of each position along the distributed dimension of a root, to
+    find the positions inside an interval (or the nearest one).
+    """
+
+    def __init__(self, values, dimension, units=None, calendar='standard'):
+        self.values = np.asarray(values, dtype='f8').ravel()
+        self.dimension = dimension
+        self.sorted = bool((np.diff(self.values) >= 0).all())
+        self.units = units
+        self.calendar = calendar
+
+    def number(self, value):
+        return as_number(value, self.units, self.calendar)
+
+    def window(self, start=None, stop=None):
+        """
+        Return the (begin, end) positions of the times between start and
+        stop (both included), where None is unbounded.
+        """
+        low = -np.inf if start is None else self.number(start)
+        high = np.inf if stop is None else self.number(stop)
+        if self.sorted:
+            return (int(np.searchsorted(self.values, low, side='left')),
+                    int(np.searchsorted(self.values, high, side='right')))
+        inside = np.flatnonzero((self.values >= low) & (self.values <= high))
+        return ((int(inside[0]), int(inside[-1]) + 1) if len(inside)
+                else (0, 0))
+
+    def nearest(self, value):
+        position = int(np.argmin(np.abs(self.values - self.number(value))))
+        return position, position + 1
+
+
+class SpatialIndex(object):
+    """
+    A grid of bins over the latitudes and longitudes of a (curvilinear)
+    grid, keeping the pixels of each bin to find the nearest pixel or the
+    pixels inside a box without scanning the whole grid.
+    """
+
+    def __init__(self, lat, lon, dimensions, density=8):
+        lat, lon = np.broadcast_arrays(np.asarray(lat, dtype='f8'),
+                                       np.asarray(lon, dtype='f8'))
+        self.dimensions = dimensions
+        self.shape = lat.shape
+        self.lat, self.lon = lat.ravel(), lon.ravel()
+        valid = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lon))
+        if not len(valid):
+            raise Exception('The grid has not valid coordinates.')
+        self.bins = max(1, int(np.sqrt(len(valid) / float(density))))
+        self.low = np.array([self.lat[valid].min(), self.lon[valid].min()])
+        self.size = np.array([self.lat[valid].max(),
+                              self.lon[valid].max()]) - self.low
+        self.size[self.size == 0] = 1.
+        rows, cols = self.cell(self.lat[valid], self.lon[valid])
+        keys = rows * self.bins + cols
+        order = np.argsort(keys, kind='mergesort')
+        self.pixels = valid[order]
+        self.starts = np.searchsorted(keys[order],
+                                      np.arange(self.bins ** 2 + 1))
+
+    def cell(self, lat, lon):
+        position = lambda v, i: np.clip(np.floor(
+            (np.asarray(v) - self.low[i]) / self.size[i] * self.bins),
+            0, self.bins - 1).astype(int)
+        return position(lat, 0), position(lon, 1)
+
+    def members(self, rows, cols):
+        """
+        Return the pixels of the bins between the given rows and columns
+        (both included).
+        """
+        rows = np.arange(max(rows[0], 0), min(rows[1], self.bins - 1) + 1)
+        cols = np.arange(max(cols[0], 0), min(cols[1], self.bins - 1) + 1)
+        keys = (rows[:, np.newaxis] * self.bins + cols).ravel()
+        parts = [self.pixels[self.starts[k]:self.starts[k + 1]] for k in keys]
+        return np.concatenate(parts) if parts else np.array([], dtype=int)
+
+    def reach(self, rows, cols, lat, lon, scale):
+        """
+        Return the distance from a point to the nearest bin outside the
+        given rows and columns (infinite when they cover every bin).
+        """
+        height, width = self.size / self.bins
+        limits = [np.inf]
+        if rows[0] > 0:
+            limits.append(lat - (self.low[0] + rows[0] * height))
+        if rows[1] < self.bins - 1:
+            limits.append(self.low[0] + (rows[1] + 1) * height - lat)
+        if cols[0] > 0:
+            limits.append((lon - (self.low[1] + cols[0] * width)) * scale)
+        if cols[1] < self.bins - 1:
+            limits.append((self.low[1] + (cols[1] + 1) * width - lon) * scale)
+        return max(min(limits), 0.)
+
+    def nearest(self, lat, lon):
+        """
+        Return the (row, column) of the pixel nearest to a point, searching
+        rings of bins around it until the pixels outside the searched bins
+        can't be nearer than the ones found (the point can be outside the
+        grid).
+        """
+        row, col = self.cell(lat, lon)
+        scale = np.cos(np.radians(lat))
+        ring = 0
+        while True:
+            rows = (max(row - ring, 0), min(row + ring, self.bins - 1))
+            cols = (max(col - ring, 0), min(col + ring, self.bins - 1))
+            candidates = self.members(rows, cols)
+            if len(candidates):
+                distances = ((self.lat[candidates] - lat) ** 2 +
+                             ((self.lon[candidates] - lon) * scale) ** 2)
+                if (distances.min() <=
+                        self.reach(rows, cols, lat, lon, scale) ** 2):
+                    break
+            ring += 1
+        pixel = candidates[np.argmin(distances)]
+        return tuple([int(i) for i in np.unravel_index(pixel, self.shape)])
+
+    def box(self, lat, lon):
+        """
+        Return the ((begin, end), (begin, end)) rows and columns that cover
+        the pixels inside the latitude and longitude intervals, or None when
+        there aren't pixels inside.
+        """
+        (lat_low, lat_high), (lon_low, lon_high) = sorted(lat), sorted(lon)
+        rows, cols = self.cell([lat_low, lat_high], [lon_low, lon_high])
+        candidates = self.members(rows, cols)
+        inside = candidates[(self.lat[candidates] >= lat_low) &
+                            (self.lat[candidates] <= lat_high) &
+                            (self.lon[candidates] >= lon_low) &
+                            (self.lon[candidates] <= lon_high)]
+        if not len(inside):
+            return None
+        rows, cols = np.unravel_index(inside, self.shape)
+        return ((int(rows.min()), int(rows.max()) + 1),
+                (int(cols.min()), int(cols.max()) + 1))
+
+
+def attribute(variable, name, default=None):
+    return (getattr(variable, name) if name in variable.ncattrs()
+            else default)
+
+
+def time_index(time):
+    """
+    Return a TimeIndex with the values of a time variable.
+    """
+    variable = time.blocks()[0][0]
+    return TimeIndex(time[:], variable.dimensions[0],
+                     attribute(variable, 'units'),
+                     attribute(variable, 'calendar', 'standard'))
+
+
+def spatial_index(lat, lon):
+    """
+    Return a SpatialIndex with the values of the lat and lon variables,
+    which can be 2D grids or 1D axes.
+    """
+    lat_dims = lat.blocks()[0][0].dimensions
+    lon_dims = lon.blocks()[0][0].dimensions
+    # the fill values are left out of the index.
+    lat_values, lon_values = [
+        np.where(valid(v[:], fill_values(v.blocks()[0][0])), v[:], np.nan)
+        for v in [lat, lon]]
+    if len(lat_dims) == 1 and len(lon_dims) == 1:
+        return SpatialIndex(lat_values.ravel()[:, np.newaxis],
+                            lon_values.ravel()[np.newaxis, :],
+                            (lat_dims[0], lon_dims[0]))
+    return SpatialIndex(lat_values.reshape(lat_values.shape[-2:]),
+                        lon_values.reshape(lon_values.shape[-2:]),
+                        tuple(lat_dims[-2:]))
@@ -0,0 +1,137 @@
+from pool import DimensionDescriptor
+from lookup import as_number
+from netCDF4 import Dataset
+import numpy as np
+import json
+import os
+
+
+class Manifest(object):
+    """
+    On disk description of the files of a package (size, modification time,
+    dimension lengths and variables metadata), used to reopen the package
+    without opening each file. The entries of modified files are ignored.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.owner = None
+        self.entries = {}
+        if os.path.isfile(filename):
+            with open(filename) as manifest:
+                self.entries = json.load(manifest)
+
+    def stat(self, filename):
+        info = os.stat(filename)
+        return [info.st_mtime, info.st_size]
+
+    def lookup(self, filename):
+        """
+        Return the descriptors of a file, or None if the file was modified
+        after the last record.
+        """
+        entry = self.fresh(filename)
+        if not entry or 'dimensions' not in entry:
+            return None
+        return {
+            'dimensions': {k: DimensionDescriptor(*d) for k, d
+                           in entry['dimensions'].items()},
+            'variables': {k: (tuple(v[0]), np.dtype(str(v[1])), tuple(v[2]))
+                          for k, v in entry['variables'].items()},
+        }
+
+    def fresh(self, filename):
+        key = os.path.abspath(filename)
+        entry = self.entries.get(key)
+        if not entry or not os.path.isfile(key):
+            return None
+        return entry if entry['stat'] == self.stat(key) else None
+
+    def time_range(self, filename):
+        """
+        Return the time range of a file, reading it only when it wasn't
+        recorded after the last modification of the file.
+        """
+        entry = self.fresh(filename)
+        if entry and 'time' in entry:
+            return entry['time']
+        bounds = read_time_range(filename)
+        if not entry:
+            entry = {'stat': self.stat(filename)}
+            self.entries[os.path.abspath(filename)] = entry
+        entry['time'] = bounds
+        return bounds
+
+    def record(self, handles):
+        for handle in handles:
+            descriptors = handle.descriptors
+            dims = descriptors['dimensions']
+            variables = descriptors['variables']
+            previous = self.fresh(handle.filename)
+            entry = self.entries[os.path.abspath(handle.filename)] = {
+                'stat': self.stat(handle.filename),
+                'dimensions': {k: [len(d), d.isunlimited()]
+                               for k, d in dims.items()},
+                'variables': {k: [list(v[0]), v[1].str, list(v[2])]
+                              for k, v in variables.items()},
+            }
+            if previous and 'time' in previous:
+                entry['time'] = previous['time']
+
+    def save(self):
+        self.entries = {k: v for k, v in self.entries.items()
+                        if os.path.isfile(k)}
+        with open(self.filename, 'w') as manifest:
+            json.dump(self.entries, manifest)
+
+
+def read_time_range(filename, name='time'):
+    """
+    Return the [minimum, maximum, units, calendar] of the time variable of a
+    file, or None when it hasn't valid times.
+    """
+    dataset = Dataset(filename, mode='r')
+    try:
+        if name not in dataset.variables:
+            return None
+        variable = dataset.variables[name]
+        values = np.ma.compressed(variable[:])
+        if not values.size:
+            return None
+        attrs = variable.ncattrs()
+        return [float(values.min()), float(values.max()),
+                variable.units if 'units' in attrs else None,
+                variable.calendar if 'calendar' in attrs else 'standard']
+    finally:
+        dataset.close()
+
+
+def prune(files, time_range, manifest=None):
+    """
+    Return the files with times inside the (start, stop) interval (where
+    None is unbounded), keeping the new files and the files without times.
+    The time range of each file is taken from the manifest when it is up to
+    date.
+
+    Keyword arguments:
+    files -- the list of filenames.
+    time_range -- the (start, stop) interval, of numbers or datetimes.
+    manifest -- the Manifest that caches the time range of each file
+    (default None, read each time variable).
+    """
+    start, stop = time_range
+    kept = []
+    for filename in files:
+        if not os.path.isfile(filename):
+            kept.append(filename)
+            continue
+        bounds = (manifest.time_range(filename) if manifest is not None
+                  else read_time_range(filename))
+        if bounds is None:
+            kept.append(filename)
+            continue
+        low, high, units, calendar = bounds
+        if ((start is None or high >= as_number(start, units, calendar)) and
+                (stop is None or low <= as_number(stop, units, calendar))):
+            kept.append(filename)
+    return kept
@@ -0,0 +1,169 @@
+from numbers import Integral
+import numpy as np
+import struct
+import os
+
+
+TYPES = {1: 'i1', 2: 'S1', 3: '>i2', 4: '>i4', 5: '>f4', 6: '>f8'}
+TAGS = {'dimensions': 0x0A, 'variables': 0x0B, 'attributes': 0x0C}
+
+
+class ClassicHeader(object):
+    """
+    Parse the header of a NETCDF3 file (CDF-1 or CDF-2) to obtain where is
+    stored each variable.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        magic = stream.read(4)
+        if len(magic) < 4 or magic[:3] != b'CDF' or magic[3:] not in [
+                b'\x01', b'\x02']:
+            raise ValueError('It is not a NETCDF3 classic file.')
+        self.offset_format = '>I' if magic[3:] == b'\x01' else '>Q'
+        self.numrecs = self.read('>I')
+        if self.numrecs == 0xFFFFFFFF:
+            raise ValueError('The file is being streamed.')
+        self.dimensions = self.read_list('dimensions', self.read_dimension)
+        self.read_list('attributes', self.read_attribute)
+        self.variables = self.read_list('variables', self.read_variable)
+
+    def read(self, fmt):
+        size = struct.calcsize(fmt)
+        return struct.unpack(fmt, self.stream.read(size))[0]
+
+    def read_padded(self, size):
+        data = self.stream.read(size)
+        self.stream.read(-size % 4)
+        return data
+
+    def read_name(self):
+        return self.read_padded(self.read('>I')).decode('utf-8')
+
+    def read_list(self, kind, read_element):
+        tag, count = self.read('>I'), self.read('>I')
+        if tag not in [0, TAGS[kind]]:
+            raise ValueError('Unexpected {:s} list.'.format(kind))
+        return [read_element() for _ in range(count)]
+
+    def read_dimension(self):
+        return self.read_name(), self.read('>I')
+
+    def read_attribute(self):
+        name = self.read_name()
+        nc_type, count = self.read('>I'), self.read('>I')
+        self.read_padded(count * np.dtype(TYPES[nc_type]).itemsize)
+        return name
+
+    def read_variable(self):
+        name = self.read_name()
+        dimids = [self.read('>I') for _ in range(self.read('>I'))]
+        self.read_list('attributes', self.read_attribute)
+        nc_type = self.read('>I')
+        self.read('>I')
+        begin = self.read(self.offset_format)
+        lengths = [self.dimensions[i][1] for i in dimids]
+        return name, TYPES[nc_type], lengths, begin
+
+
+def is_basic(index):
+    return (isinstance(index, (Integral, slice)) or index is Ellipsis) and \
+        not isinstance(index, bool)
+
+
+class Mapping(object):
+    """
+    Memory mapped views of the variables of a NETCDF3 file, which are
+    rebuilt after the file is written through the netCDF library.
+    """
+
+    def __init__(self, filename, writable, dataset):
+        self.filename = filename
+        self.writable = writable
+        self.dataset = dataset
+        self.stale = True
+        self.views = {}
+
+    def refresh(self):
+        if self.writable:
+            self.dataset.sync()
+        self.views = {}
+        size = os.path.getsize(self.filename)
+        self.stale = False
+        try:
+            with open(self.filename, 'rb') as stream:
+                header = ClassicHeader(stream)
+        except ValueError:
+            return
+        buffer = (np.memmap(self.filename, dtype=np.uint8,
+                            mode='r+' if self.writable else 'r')
+                  if size else None)
+        records = [v for v in header.variables if v[2] and v[2][0] == 0]
+        padded = lambda n: n + (-n % 4 if len(records) > 1 else 0)
+        row = lambda v: int(np.prod(v[2][1:])) * np.dtype(v[1]).itemsize
+        recsize = sum([padded(row(v)) for v in records])
+        for name, dtype, lengths, begin in header.variables:
+            dtype = np.dtype(dtype)
+            record = lengths and lengths[0] == 0
+            shape = ((header.numrecs,) + tuple(lengths[1:]) if record
+                     else tuple(lengths))
+            strides = tuple([int(s) for s in np.cumprod(
+                [dtype.itemsize] + list(shape[:0:-1]))[::-1]][:len(shape)])
+            if record:
+                strides = (recsize,) + strides[1:]
+                end = begin + max(shape[0] - 1, 0) * recsize + row(
+                    (name, dtype, lengths, begin))
+            else:
+                end = begin + int(np.prod(shape)) * dtype.itemsize
+            if buffer is not None and end <= size:
+                self.views[name] = np.ndarray(shape, dtype=dtype,
+                                              buffer=buffer, offset=begin,
+                                              strides=strides)
+
+    def view(self, name):
+        if self.stale:
+            self.refresh()
+        return self.views.get(name)
+
+    def close(self):
+        self.views = {}
+        self.stale = True
+
+
+class MappedVariable(object):
+    """
+    Stand in for a netCDF4 Variable that answers the reads with integers
+    and slices using a memory mapped view, when the values don't need to be
+    masked or scaled.
+    """
+
+    def __init__(self, mapping, variable):
+        self.mapping = mapping
+        self.variable = variable
+        self.maskandscale = True
+
+    def set_auto_maskandscale(self, value):
+        self.maskandscale = value
+        self.variable.set_auto_maskandscale(value)
+
+    def __getitem__(self, indexes):
+        basic = all(map(is_basic, indexes if isinstance(indexes, tuple)
+                        else (indexes,)))
+        view = (self.mapping.view(self.variable.name)
+                if basic and not self.maskandscale else None)
+        if view is None:
+            return self.variable[indexes]
+        return view[indexes]
+
+    def __setitem__(self, indexes, changes):
+        self.variable[indexes] = changes
+        self.mapping.stale = True
+
+    def __array__(self, *args):
+        return self[:].__array__(*args)
+
+    def __len__(self):
+        return len(self.variable)
+
+    def __getattr__(self, name):
+        return getattr(self.variable, name)
@@ -0,0 +1,215 @@
+from netcdf import (NCVariable, is_basic, is_integer, check_out, fill,
+                    sync_group)
+from pool import DimensionDescriptor, library_locked
+from reductions import fill_values
+from collections import OrderedDict
+import numpy as np
+
+
+def coordinate_key(dataset, name):
+    """
+    Return the value used to sort a file along a dimension: the first value
+    of its coordinate variable (negated when the coordinate decreases), or
+    None when the file hasn't a coordinate variable.
+    """
+    variable = dataset.variables.get(name)
+    if variable is None or tuple(variable.dimensions) != (name,):
+        return None
+    values = np.ma.filled(variable[:2], np.nan).astype('f8')
+    if not len(values):
+        return None
+    if len(values) > 1 and values[1] < values[0]:
+        return -values[0]
+    return values[0]
+
+
+class Layout(object):
+    """
+    The place of each file of a package along the concatenated dimensions,
+    given by the first value of their coordinate variables (or by the order
+    of the filenames when a single dimension hasn't a coordinate variable).
+    """
+
+    def __init__(self, datasets, dimensions):
+        self.dimensions = tuple(dimensions)
+        self.offsets, self.lengths, self.sizes = {}, {}, {}
+        for name in self.dimensions:
+            self.place(datasets, name)
+        cells = [tuple([self.offsets[d][i] for d in self.dimensions])
+                 for i in range(len(datasets))]
+        if len(set(cells)) != len(cells):
+            raise Exception('There are files with the same place along the '
+                            '{:s} dimensions.'.format(
+                                ', '.join(self.dimensions)))
+
+    def place(self, datasets, name):
+        if any([name not in d.dimensions for d in datasets]):
+            raise Exception('Every file should have the {:s} dimension to '
+                            'concatenate them.'.format(name))
+        lengths = [len(d.dimensions[name]) for d in datasets]
+        keys = [coordinate_key(d, name) for d in datasets]
+        if None in keys:
+            if len(self.dimensions) > 1:
+                raise Exception('The mosaic needs the {:s} coordinate '
+                                'variable in every file.'.format(name))
+            keys = range(len(datasets))
+        sizes = OrderedDict()
+        for key, length in sorted(zip(keys, lengths)):
+            if sizes.setdefault(key, length) != length:
+                raise Exception('The files at the same place have different '
+                                '{:s} lengths.'.format(name))
+        starts = dict(zip(sizes.keys(),
+                          np.cumsum([0] + list(sizes.values()))[:-1]))
+        self.offsets[name] = [int(starts[k]) for k in keys]
+        self.lengths[name] = lengths
+        self.sizes[name] = int(sum(sizes.values()))
+
+
+def pieces(positions, start, length):
+    """
+    Return the (output, local, backwards) slices that place the positions
+    of an axis inside a file extent, or None when they don't touch it.
+    """
+    if not positions.ndim:
+        if start <= positions < start + length:
+            return None, int(positions - start), False
+        return None
+    inside = np.flatnonzero((positions >= start) &
+                            (positions < start + length))
+    if not len(inside):
+        return None
+    local = positions[inside] - start
+    step = int(local[1] - local[0]) if len(local) > 1 else 1
+    output = slice(int(inside[0]), int(inside[-1]) + 1)
+    if step > 0:
+        return output, slice(int(local[0]), int(local[-1]) + 1, step), False
+    return output, slice(int(local[-1]), int(local[0]) + 1, -step), True
+
+
+class MosaicNCVariable(NCVariable):
+    """
+    A variable of a package whose files are placed side by side along one
+    or more dimensions (like a spatial mosaic), reading and writing only the
+    hyperslab of each file covered by the indexes.
+    """
+
+    def __init__(self, name, variables, layout):
+        super(MosaicNCVariable, self).__init__(name, variables)
+        self.layout = layout
+        self.axes = [d for d in self.variables[0].dimensions
+                     if d in layout.dimensions]
+
+    def obtain_blocks(self):
+        return [(variable, False) for variable in self.variables]
+
+    def locate(self, indexes):
+        return None
+
+    @property
+    def shape(self):
+        self.flush()
+        variable = self.variables[0]
+        return tuple([self.layout.sizes[d] if d in self.axes else n
+                      for d, n in zip(variable.dimensions, variable.shape)])
+
+    @property
+    def dimensions(self):
+        variable = self.variables[0]
+        dims = dict(variable.group().dimensions)
+        return OrderedDict([(d, DimensionDescriptor(n, dims[d].isunlimited()))
+                            for d, n in zip(variable.dimensions, self.shape)])
+
+    def extent(self, member, axis):
+        name = self.variables[member].dimensions[axis]
+        if name not in self.axes:
+            return 0, self.variables[member].shape[axis]
+        return (self.layout.offsets[name][member],
+                self.layout.lengths[name][member])
+
+    def selection(self, indexes):
+        """
+        Return the positions selected over each axis (an array, or a scalar
+        for the integers), or None when they aren't integers or slices.
+        """
+        indexes = indexes if isinstance(indexes, tuple) else (indexes,)
+        shape = self.shape
+        if len(indexes) > len(shape) or not all(map(is_basic, indexes)):
+            return None
+        indexes += (slice(None),) * (len(shape) - len(indexes))
+        positions = []
+        for index, length in zip(indexes, shape):
+            if not is_integer(index):
+                positions.append(np.arange(*index.indices(length)))
+            elif -length <= index < length:
+                positions.append(np.array(index % length))
+            else:
+                raise IndexError('Index out of bounds for an axis with size '
+                                 '{:d}.'.format(length))
+        return positions
+
+    def hyperslabs(self, positions):
+        """
+        Yield the (member, output indexes, local indexes, reversed axes) of
+        each file covered by the positions.
+        """
+        for member in range(len(self.variables)):
+            parts = [pieces(p, *self.extent(member, axis))
+                     for axis, p in enumerate(positions)]
+            if None in parts:
+                continue
+            output = tuple([o for o, _, _ in parts if o is not None])
+            local = tuple([l for _, l, _ in parts])
+            sliced = [p for p in parts if p[0] is not None]
+            flips = [i for i, p in enumerate(sliced) if p[2]]
+            yield member, output, local, flips
+
+    @library_locked
+    def read(self, indexes, out=None):
+        """
+        Read the hyperslab of each file covered by the indexes into a single
+        array, where the places without files have the fill value.
+        """
+        self.flush()
+        positions = self.selection(indexes)
+        if positions is None:
+            return fill(out, self.read(slice(None)).__getitem__(indexes))
+        variable = self.variables[0]
+        shape = tuple([len(p) for p in positions if p.ndim])
+        result = check_out(out, shape, variable.dtype)
+        fills = fill_values(variable)
+        result[...] = fills[0] if fills else 0
+        for member, output, local, flips in self.hyperslabs(positions):
+            source = self.variables[member]
+            data = self.record('bytes_read', source,
+                               self.source(source)[local])
+            for axis in flips:
+                data = np.flip(data, axis)
+            result[output] = data
+        return result
+
+    @library_locked
+    def __getitem__(self, indexes):
+        return self.read(indexes)
+
+    def pack(self, out=None):
+        return self.read(slice(None), out)
+
+    @library_locked
+    def __setitem__(self, indexes, changes):
+        positions = self.selection(indexes)
+        if positions is None:
+            data = self.read(slice(None))
+            data[indexes] = changes
+            return self.__setitem__(slice(None), data)
+        shape = tuple([len(p) for p in positions if p.ndim])
+        data = np.broadcast_to(np.asarray(changes), shape)
+        groups = []
+        for member, output, local, flips in self.hyperslabs(positions):
+            chunk = data[output]
+            for axis in flips:
+                chunk = np.flip(chunk, axis)
+            self.store(self.variables[member], local, chunk)
+            groups.append(self.variables[member].group())
+        if self.buffer is None:
+            list(map(lambda g: sync_group(g, self.stats), groups))
+        self.changed()
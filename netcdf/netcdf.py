@@ -4,6 +4,25 @@ import numpy as np
 import os
 from glob import glob
 from contextlib import contextmanager
+from numbers import Integral
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from threading import Thread, Event
+from time import time
+import hashlib
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+from pool import (HandlePool, DatasetHandle, NETCDF_LOCK, library_locked,
+                  filepath, sync_group)
+from manifest import Manifest, prune
+from buffer import WriteBuffer, BUFFER_BYTES
+from cache import BlockCache, CachedVariable, CACHE_BYTES
+from mapping import Mapping, MappedVariable
+from stats import Stats, timer, logging_hook
+from reductions import (Reducible, Moments, Histogram, fill_values,
+                        exact_quantile, histogram_rows, QUANTILE_BINS)
 
 
 def flatten(lst):
@@ -16,21 +35,300 @@ def flatten(lst):
     return result
 
 
+def is_integer(index):
+    return isinstance(index, Integral) and not isinstance(index, bool)
+
+
+def is_basic(index):
+    return is_integer(index) or isinstance(index, slice)
+
+
+def positions_of(index, length):
+    """
+    Return the absolute positions selected by an index over the distributed
+    axis, or None when the index can't be resolved without packing the data.
+
+    Keyword arguments:
+    index -- an int, slice, integer sequence or boolean mask.
+    length -- the length of the distributed axis.
+    """
+    if isinstance(index, slice):
+        return np.arange(*index.indices(length))
+    index = np.asarray(index)
+    if index.dtype == bool:
+        return np.flatnonzero(index) if index.shape == (length,) else None
+    if index.dtype.kind not in 'iu':
+        return None
+    if ((index < -length) | (index >= length)).any():
+        raise IndexError('Index out of bounds for an axis with size '
+                         '{:d}.'.format(length))
+    return np.where(index < 0, index + length, index)
+
+
+def group_runs(positions, offsets):
+    """
+    Group consecutive positions that belong to the same block and keep a
+    constant step, so each group can be read with a single slice.
+
+    Keyword arguments:
+    positions -- a flat array with absolute positions.
+    offsets -- the cumulative offsets of each block.
+    """
+    members = np.searchsorted(offsets, positions, side='right') - 1
+    runs = []
+    for member, local in zip(members, positions - offsets[members]):
+        if runs and runs[-1][0] == member:
+            _, start, step, count = runs[-1]
+            if ((count == 1 and local != start) or
+                    (count > 1 and local == start + step * count)):
+                step = local - start if count == 1 else step
+                runs[-1] = (member, start, step, count + 1)
+                continue
+        runs.append((member, local, 0, 1))
+    return runs
+
+
+def run_slice(run):
+    """
+    Return the ascending slice that covers a run and if it should be
+    reversed to follow the run order.
+    """
+    _, start, step, count = run
+    last = start + step * (count - 1)
+    if step >= 0:
+        return slice(start, last + 1, step if step else 1), False
+    return slice(last, start + 1, -step), True
+
+
+def read_block(variable, stacked, index, rest):
+    """
+    Read a hyperslab of a block, where a stacked block is the whole variable
+    behind a new leading axis of length 1 (as pack does).
+    """
+    if not stacked:
+        return variable[(index,) + rest]
+    data = variable[rest] if rest else variable[:]
+    return data if is_integer(index) else data[np.newaxis]
+
+
+def block_index(stacked, index, rest, data):
+    """
+    Return the indexes and the data to write a hyperslab into a block.
+    """
+    if not stacked:
+        return (index,) + rest, data
+    return (rest if rest else (slice(None),),
+            data if is_integer(index) else data[0])
+
+
+def check_out(out, shape, dtype):
+    """
+    Return the out array after checking its shape and type, or a new array
+    when it is None.
+    """
+    if out is None:
+        return np.empty(shape, dtype)
+    if (out.shape != tuple(shape) or
+            not np.can_cast(dtype, out.dtype, casting='same_kind')):
+        raise Exception('The out array should have the shape {:s} and a '
+                        'type compatible with {:s} (not {:s} and {:s}).'
+                        .format(str(tuple(shape)), str(np.dtype(dtype)),
+                                str(out.shape), str(out.dtype)))
+    return out
+
+
+def fill(out, data):
+    if out is None:
+        return data
+    out = check_out(out, np.shape(data), np.asarray(data).dtype)
+    out[...] = data
+    return out
+
+
+def read_file_block(args):
+    """
+    Read a hyperslab of a block opening its file, to be called by a process.
+    """
+    filename, name, stacked, index, rest = args
+    dataset = Dataset(filename, mode='r')
+    try:
+        variable = dataset.variables[name]
+        variable.set_auto_maskandscale(False)
+        return read_block(variable, stacked, index, rest)
+    finally:
+        dataset.close()
+
+
+def prefetched(function, items):
+    """
+    Yield the result of the function over each item, computing the next
+    result on a background thread while the current one is being used.
+    """
+    queue = Queue(maxsize=1)
+    stop = Event()
+
+    def offer(message):
+        while not stop.is_set():
+            try:
+                queue.put(message, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not offer((True, function(item))):
+                    return
+        except Exception as error:
+            offer((False, error))
+            return
+        offer((False, None))
+    thread = Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            ok, result = queue.get()
+            if ok:
+                yield result
+            elif result is None:
+                return
+            else:
+                raise result
+    finally:
+        stop.set()
+
+
+def chunk_indexes(length, axis=0, size=1):
+    head = (slice(None),) * axis
+    return [head + (slice(i, min(i + size, length)),)
+            for i in range(0, length, size)]
+
+
+def iter_chunks(variable, axis=0, size=1, prefetch=False):
+    """
+    Yield (data, indexes) pairs that walk the variable in chunks of a given
+    size along an axis, where variable[indexes] is data. The item accesses
+    of the variables hold the library lock, so the loop can read and write
+    the root while the next chunk is prefetched.
+    """
+    indexes = chunk_indexes(variable.shape[axis], axis, size)
+    read = lambda index: (variable[index], index)
+
+    def locked(index):
+        with NETCDF_LOCK:
+            return read(index)
+    return (prefetched(locked, indexes) if prefetch
+            else (read(index) for index in indexes))
+
+
+CHUNK_BYTES = 2 ** 20
+COPY_BYTES = 2 ** 24
+TIME_SERIES_STEPS = 64
+
+
+def block_length(shape, axis, itemsize, budget=None):
+    """
+    Return the amount of positions along an axis whose hyperslab fits in
+    the budget of bytes (default COPY_BYTES), at least one.
+    """
+    budget = budget if budget else COPY_BYTES
+    positions = int(np.prod(shape[axis + 1:])) * itemsize
+    return max(1, budget // max(positions, 1))
+
+
+def chunk_shape(sizes, unlimited, itemsize, access):
+    """
+    Return the chunk sizes for a variable given the lengths of its
+    dimensions and the expected access pattern.
+
+    Keyword arguments:
+    sizes -- the length of each dimension.
+    unlimited -- a boolean list telling which dimensions are unlimited.
+    itemsize -- the amount of bytes of each value.
+    access -- 'spatial-slab' to read a whole grid for each step, or
+    'time-series' to read a few pixels along all the steps (the pixels of
+    a chunk are shrunk until it holds TIME_SERIES_STEPS steps, or all the
+    steps already written, and the steps fill the rest of CHUNK_BYTES).
+    """
+    sizes = [max(size, 1) for size in sizes]
+    if access == 'spatial-slab':
+        return tuple([1 if u else s for s, u in zip(sizes, unlimited)])
+    if access != 'time-series':
+        raise Exception('Unknown access pattern {:s}.'.format(access))
+    chunks = list(sizes)
+    fixed = [i for i, u in enumerate(unlimited) if not u]
+    steps = [i for i, u in enumerate(unlimited) if u]
+    budget = max(1, CHUNK_BYTES // itemsize)
+    written = int(np.prod([sizes[i] for i in steps]))
+    pixels = max(1, budget // max(TIME_SERIES_STEPS, written))
+    while fixed and int(np.prod([chunks[i] for i in fixed])) > pixels:
+        largest = max(fixed, key=lambda i: chunks[i])
+        if chunks[largest] == 1:
+            break
+        chunks[largest] = (chunks[largest] + 1) // 2
+    if steps:
+        # the steps take the rest of the budget, even when there are none yet.
+        rest = budget // int(np.prod([chunks[i] for i in fixed]))
+        rest //= int(np.prod([sizes[i] for i in steps[1:]]))
+        chunks[steps[0]] = max(1, rest)
+    return tuple(chunks)
+
+
 DTYPES = {}
 DTYPES[numpy.dtype('float32')] = 'f4'
 DTYPES[numpy.dtype('int32')] = 'i4'
+DTYPES[numpy.dtype('int16')] = 'i2'
 DTYPES[numpy.dtype('int8')] = 'i1'
 DTYPES[numpy.dtype('S1')] = 'S1'
 
 
+STATIC_MODES = ['shared', 'verified', 'stacked']
+
+
 class NCObject(object):
 
     @classmethod
-    def open(cls, files_or_pattern, read_only=False):
+    def open(cls, files_or_pattern, read_only=False, pool=None,
+             manifest=None, buffer=None, cache=None, static='shared',
+             mmap=False, readers=None, processes=None, stats=None,
+             concat=None, time_range=None, distributed_dim='time'):
+        if static not in STATIC_MODES:
+            raise Exception('Unknown static mode {:s} (should be one of '
+                            '{:s}).'.format(static, ', '.join(STATIC_MODES)))
         files, pattern = cls.distill(files_or_pattern)
+        if time_range is not None:
+            files = prune(files, time_range, manifest)
+            if not files:
+                raise Exception('There are not files with times between '
+                                '{:s} and {:s}.'.format(*map(str, time_range)))
         obj = cls.choice_type(files)
         obj.pattern = pattern
+        obj.static = static
+        obj.distributed_dim = distributed_dim
+        obj.concat = ((concat,) if isinstance(concat, str)
+                      else tuple(concat) if concat else ())
+        obj.mmap = mmap
+        obj.read_workers = readers
+        obj.pool = pool
+        obj.manifest = manifest
+        obj.buffer = buffer
+        obj.cache = cache
+        obj.stats = stats
+        if manifest is not None and manifest.owner is None:
+            manifest.owner = obj
+        if buffer is not None and buffer.owner is None:
+            buffer.owner = obj
+        begin = time()
         obj.load(read_only=read_only)
+        obj.load_time = time() - begin
+        obj.processes = obj.read_only if processes is None else processes
+        if obj.owns_manifest:
+            obj.describe_handles()
+            manifest.record(obj.handles())
+            manifest.save()
         return obj
 
     @classmethod
@@ -63,6 +361,20 @@ class NCObject(object):
         self.variable_wrapper = lambda name, vars: name, vars
         self.create_dim = 'create_dimension'
         self._read_only = True
+        self.pool = None
+        self.manifest = None
+        self.buffer = None
+        self.cache = None
+        self.stats = None
+        self.static = 'shared'
+        self.distributed_dim = 'time'
+        self.concat = ()
+        self.mmap = False
+        self.mapping = None
+        self.read_workers = None
+        self.processes = False
+        self._readers = None
+        self.lookups = {}
 
     @property
     def is_new(self):
@@ -94,29 +406,93 @@ class NCObject(object):
                         (str(args), str(kwargs)))
 
     def getvar(self, name, vtype='', dimensions=(), digits=0,
-               fill_value=None, source=None):
+               fill_value=None, source=None, block_size=None, progress=None,
+               **storage):
         if source:
-            self.copy_in(name, vtype, source)
+            self.copy_in(name, vtype, source, block_size, progress,
+                         **storage)
         if name not in self.variables.keys():
             varstmp = self.obtain_variable(name, vtype, dimensions,
-                                           digits, fill_value)
+                                           digits, fill_value, **storage)
             self.variables[name] = self.variable_wrapper(name, varstmp)
+            self.variables[name].root = self
         return self.variables[name]
 
+    def invalidate(self):
+        for variable in self.variables.values():
+            variable.invalidate()
+
+    def lookup(self, names, build):
+        """
+        Return the index built with the variables of the given names, which
+        is kept until one of them is written.
+        """
+        if names not in self.lookups:
+            self.lookups[names] = build(*[self.getvar(n) for n in names])
+        return self.lookups[names]
+
+    def forget(self, name):
+        for key in [k for k in self.lookups if name in k]:
+            self.lookups.pop(key)
+
+    def flush(self):
+        if self.buffer is not None:
+            self.buffer.flush()
+
     def sync(self):
+        self.flush()
         return [r.sync() for r in self.roots]
 
+    @property
+    def owns_manifest(self):
+        return self.manifest is not None and self.manifest.owner is self
+
+    def handles(self):
+        return sum([r.handles() if isinstance(r, NCObject) else [r]
+                    for r in self.roots], [])
+
+    def describe_handles(self):
+        opened = [h for h in self.handles() if h.dataset]
+        list(map(lambda h: h.describe(), opened))
+
+    def readers(self):
+        """
+        Return the pool used to read the files concurrently, or None when
+        there aren't readers.
+        """
+        if (self._readers is None and self.read_workers and
+                self.read_workers > 1):
+            self._readers = (Pool if self.processes
+                             else ThreadPool)(self.read_workers)
+        return self._readers
+
     def close(self):
+        self.flush()
+        if self._readers is not None:
+            self._readers.close()
+            self._readers.join()
+            self._readers = None
+        if self.owns_manifest:
+            self.describe_handles()
         status = [r.close() for r in self.roots]
         self.variables = None
+        if self.mapping is not None:
+            self.mapping.close()
+        if self.cache is not None:
+            self.cache.clear()
+        if self.owns_manifest:
+            self.manifest.record(self.handles())
+            self.manifest.save()
         return status
 
-    def copy_in(self, name, vtype, source):
+    def copy_in(self, name, vtype, source, block_size=None, progress=None,
+                **storage):
         # create dimensions if not exists.
         dims = source.dimensions
         gt1_or_none = lambda x: len(x) if len(x) > 1 else None
-        create_dim = lambda d: self.getdim(d, None if d is u'time'
-                                           else gt1_or_none(dims[d]))
+        create_dim = lambda d: self.getdim(
+            d, None if d == u'time' or dims[d].isunlimited()
+            else gt1_or_none(dims[d]))
         list(map(create_dim, dims))
         dimensions = tuple(reversed([str(k)
                                      for k in source.dimensions.keys()]))
@@ -124,23 +500,46 @@ class NCObject(object):
         options = {'fill_value': 0.0}
         if vtype_tmp == 'f4':
             options['digits'] = source.least_significant_digit
+        options.update(storage)
         var = self.getvar(name, vtype_tmp, dimensions, **options)
-        source.copy_to(var)
+        source.copy_to(var, block_size, progress)
 
 
 class NCFile(NCObject):
 
+    def dataset(self, mode):
+        filename = self.files[0]
+        if self.pool is not None:
+            return DatasetHandle(filename, mode, self.pool, format='NETCDF4')
+        return Dataset(filename, mode=mode, format='NETCDF4')
+
     def load(self, read_only=False):
+        with timer(self.stats, 'opens', file=self.files[0]):
+            self.load_dataset(read_only)
+
+    def load_dataset(self, read_only=False):
         filename = self.files[0]
-        try:
-            if read_only:
-                raise Exception('Forced to be a read only access.')
-            self.roots = [(Dataset(filename, mode='w', format='NETCDF4')
-                           if self.is_new else Dataset(filename, mode='a',
-                                                       format='NETCDF4'))]
-            self._read_only = False
-        except Exception:
-            self.roots = [Dataset(filename, mode='r', format='NETCDF4')]
+        descriptors = (self.manifest.lookup(filename)
+                       if self.manifest is not None else None)
+        if descriptors:
+            writable = not read_only and os.access(filename, os.W_OK)
+            self.roots = [DatasetHandle(filename, 'a' if writable else 'r',
+                                        self.pool, format='NETCDF4',
+                                        descriptors=descriptors)]
+            self._read_only = not writable
+        else:
+            try:
+                if read_only:
+                    raise Exception('Forced to be a read only access.')
+                self.roots = [(self.dataset('w')
+                               if self.is_new else self.dataset('a'))]
+                self._read_only = False
+            except Exception:
+                self.roots = [self.dataset('r')]
+        if (self.mmap and not self.is_new and
+                self.roots[0].data_model.startswith('NETCDF3')):
+            self.mapping = Mapping(filename, not self._read_only,
+                                   self.roots[0])
         self.variable_wrapper = SingleNCVariable
         self.create_dim = 'createDimension'
 
@@ -148,21 +547,54 @@ class NCFile(NCObject):
     def read_only(self):
         return self._read_only
 
+    def sync(self):
+        with timer(self.stats, 'syncs', file=self.files[0]):
+            return super(NCFile, self).sync()
+
     def obtain_variable(self, name, vtype='f4', dimensions=(), digits=0,
-                        fill_value=None):
+                        fill_value=None, **storage):
         root = self.roots[0]
-        return (root.variables[name] if name in root.variables.keys()
+        return (self.mapped(root.variables[name])
+                if name in root.variables.keys()
                 else self.create_variable(name, vtype, dimensions,
-                                          digits, fill_value))
+                                          digits, fill_value, **storage))
+
+    def mapped(self, variable):
+        """
+        Return the variable, reading through the memory mapped file if any.
+        """
+        if self.mapping is None:
+            return variable
+        return MappedVariable(self.mapping, variable)
+
+    def chunk_shape(self, dimensions, vtype, access):
+        dims = self.roots[0].dimensions
+        return chunk_shape([len(dims[d]) for d in dimensions],
+                           [dims[d].isunlimited() for d in dimensions],
+                           np.dtype(vtype).itemsize, access)
 
     def create_variable(self, name, vtype='f4', dimensions=(), digits=0,
-                        fill_value=None):
+                        fill_value=None, chunksizes=None, complevel=4,
+                        shuffle=True, fletcher32=False, contiguous=False,
+                        access=None):
         build = self.roots[0].createVariable
-        options = {'zlib': True,
+        options = {'zlib': not contiguous,
                    'fill_value': fill_value}
+        if contiguous:
+            options['contiguous'] = True
+        else:
+            options.update({'complevel': complevel,
+                            'shuffle': shuffle,
+                            'fletcher32': fletcher32})
+            if access and not chunksizes:
+                chunksizes = self.chunk_shape(dimensions, vtype, access)
+            if chunksizes:
+                options['chunksizes'] = chunksizes
         if digits > 0:
             options['least_significant_digit'] = digits
-        varstmp = [build(name, vtype, dimensions, **options)]
+        varstmp = [self.mapped(build(name, vtype, dimensions, **options))]
+        if self.mapping is not None:
+            self.mapping.stale = True
         not_auto_mask = lambda v: v.set_auto_maskandscale(False)
         list(map(not_auto_mask, varstmp))
         return varstmp
@@ -170,22 +602,88 @@ class NCFile(NCObject):
 
 class NCPackage(NCObject):
 
+    def open_member(self, filename, read_only):
+        begin = time()
+        try:
+            return (NCObject.open(filename, read_only, pool=self.pool,
+                                  manifest=self.manifest,
+                                  buffer=self.buffer, cache=self.cache,
+                                  mmap=self.mmap, stats=self.stats),
+                    time() - begin)
+        except Exception as e:
+            return e, time() - begin
+
     def load(self, read_only=False):
-        self.roots = [NCObject.open(filename, read_only)
-                      for filename in self.files]
-        self.variable_wrapper = DistributedNCVariable
+        open_member = lambda filename: self.open_member(filename, read_only)
+        results = list(map(open_member, self.files))
+        failed = [(f, r) for f, (r, _) in zip(self.files, results)
+                  if isinstance(r, Exception)]
+        if failed:
+            opened = [r for r, _ in results if not isinstance(r, Exception)]
+            list(map(lambda r: r.close(), opened))
+            raise Exception('Unable to open {:d} files: {:s}'.format(
+                len(failed), ', '.join(['{:s} ({:s})'.format(f, str(e))
+                                        for f, e in failed])))
+        self.roots = [r for r, _ in results]
+        self.open_times = [t for _, t in results]
+        self.variable_wrapper = self.wrap_variable
+        self._layout = None
 
     @property
     def read_only(self):
         return all([r.read_only for r in self.roots])
 
+    def is_static(self, variables):
+        """
+        Return True when the variable has the same shape in every file and
+        it hasn't the distributed dimension nor an unlimited one (so it
+        isn't distributed).
+        """
+        first = variables[0].variables[0]
+        dims = first.group().dimensions
+        return (len(first.dimensions) > 0 and
+                self.distributed_dim not in first.dimensions and
+                not any([dims[d].isunlimited() for d in first.dimensions]) and
+                all([v.variables[0].shape == first.shape
+                     for v in variables]))
+
+    def layout(self):
+        """
+        Return the place of each file along the concatenated dimensions.
+        """
+        if self._layout is None:
+            self._layout = Layout([r.roots[0] for r in self.roots],
+                                  self.concat)
+        return self._layout
+
+    def wrap_variable(self, name, variables):
+        if self.concat:
+            first = variables[0].variables[0]
+            netcdf_variables = [v.variables[0] for v in variables]
+            if any([d in self.concat for d in first.dimensions]):
+                return MosaicNCVariable(name, netcdf_variables,
+                                        self.layout())
+            return StaticNCVariable(name, netcdf_variables,
+                                    verify=self.static == 'verified')
+        if self.static != 'stacked' and self.is_static(variables):
+            return StaticNCVariable(name,
+                                    [v.variables[0] for v in variables],
+                                    verify=self.static == 'verified')
+        return DistributedNCVariable(name, variables)
+
     def obtain_variable(self, name, vtype='f4', dimensions=(), digits=0,
-                        fill_value=None):
-        return [r.getvar(name, vtype, dimensions, digits, fill_value)
+                        fill_value=None, **storage):
+        return [r.getvar(name, vtype, dimensions, digits, fill_value,
+                         **storage)
                 for r in self.roots]
 
+    def invalidate(self):
+        super(NCPackage, self).invalidate()
+        for r in self.roots:
+            r.invalidate()
+
 
-class NCVariable(object):
+class NCVariable(Reducible):
 
     def __init__(self, name, variables):
         self.name = name
@@ -193,6 +691,10 @@ class NCVariable(object):
                           if variables.__class__ is list else [variables])
         not_auto_mask = lambda v: v.set_auto_maskandscale(False)
         list(map(not_auto_mask, self.variables))
+        self.root = None
+        self._offsets = None
+        self._blocks = None
+        self._shape = None
 
     def set_auto_maskandscale(self, value):
         not_auto_mask = lambda v: v.set_auto_maskandscale(value)
@@ -203,7 +705,43 @@ class NCVariable(object):
 
     @property
     def shape(self):
-        return self.pack().shape
+        self.flush()
+        if self._shape is None:
+            variable, stacked = self.blocks()[0]
+            self._shape = ((int(self.offsets()[-1]),) +
+                           tuple(variable.shape[0 if stacked else 1:]))
+        return self._shape
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def unlimited(self):
+        variable = self.blocks()[0][0]
+        dims = variable.group().dimensions
+        return any([dims[d].isunlimited() for d in variable.dimensions])
+
+    def invalidate(self):
+        self._offsets = None
+        self._blocks = None
+        self._shape = None
+
+    def changed(self):
+        """
+        Drop the cached shapes after a write, including the other variables
+        of the root when the variable could have grown an unlimited
+        dimension.
+        """
+        if self.unlimited and self.root:
+            self.root.invalidate()
+        if self.root:
+            self.root.forget(self.name)
+        self.invalidate()
 
     @property
     def dimensions(self):
@@ -223,11 +761,359 @@ class NCVariable(object):
 
     @property
     def vtype(self):
-        return DTYPES[np.dtype(self.dtype)]
+        dtype = np.dtype(self.dtype)
+        return DTYPES.get(dtype, dtype.str[1:])
 
+    @library_locked
     def __getitem__(self, indexes):
+        self.flush()
         return self.pack().__getitem__(indexes)
 
+    @property
+    def buffer(self):
+        return self.root.buffer if self.root else None
+
+    @property
+    def cache(self):
+        return self.root.cache if self.root else None
+
+    @property
+    def stats(self):
+        return self.root.stats if self.root else None
+
+    def record(self, name, variable, data):
+        """
+        Count the bytes of data read from (or written into) the file of a
+        netCDF variable, when the root has stats.
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.count(name, np.size(data) * variable.dtype.itemsize,
+                        file=filepath(variable.group()))
+        return data
+
+    def source(self, variable):
+        """
+        Return the variable, reading through the cache of the root if any.
+        """
+        cache = self.cache
+        if cache is None or isinstance(variable, MappedVariable):
+            return variable
+        return CachedVariable(cache, variable)
+
+    def read_block(self, variable, stacked, index, rest):
+        return read_block(self.source(variable), stacked, index, rest)
+
+    def flush(self):
+        """
+        Write the buffered changes of the variable before reading it.
+        """
+        buffer = self.buffer
+        if buffer is not None and buffer.entries:
+            buffer.flush([variable for variable, _ in self.blocks()])
+
+    def write_block(self, variable, stacked, index, rest, data):
+        self.store(variable, *block_index(stacked, index, rest, data))
+
+    def store(self, variable, index, data):
+        """
+        Write a hyperslab of a netCDF variable, through the buffer of the
+        root if any.
+        """
+        self.record('bytes_written', variable, data)
+        if self.cache is not None:
+            self.cache.discard(variable)
+        if self.buffer is None:
+            variable[index] = data
+        else:
+            self.buffer.add(variable, index, data)
+
+    def obtain_blocks(self):
+        """
+        Return a list of (netCDF4 variable, stacked) pairs, in the same order
+        that pack uses to build the first axis.
+        """
+        raise Exception('Subclass responsability')
+
+    def blocks(self):
+        if self._blocks is None:
+            self._blocks = self.obtain_blocks()
+        return self._blocks
+
+    def offsets(self):
+        if self._offsets is None:
+            rows = [1 if stacked else variable.shape[0]
+                    for variable, stacked in self.blocks()]
+            self._offsets = np.cumsum([0] + rows)
+        return self._offsets
+
+    def locate(self, indexes):
+        """
+        Return the positions over the first axis and the remaining indexes,
+        or None when the indexes can't be mapped to the blocks.
+        """
+        indexes = indexes if isinstance(indexes, tuple) else (indexes,)
+        if not indexes or not all(map(is_basic, indexes[1:])):
+            return None
+        positions = positions_of(indexes[0], self.offsets()[-1])
+        return None if positions is None else (positions, indexes[1:])
+
+    def empty(self, rest):
+        variable, stacked = self.blocks()[0]
+        shape = variable.shape[0 if stacked else 1:]
+        empty = np.empty((0,) + tuple(shape), dtype=variable.dtype)
+        return empty[(slice(None),) + rest]
+
+    def axis(self, name):
+        """
+        Return the position of a dimension, where stacked variables use None
+        as the name of their first axis.
+        """
+        if is_integer(name):
+            return name
+        variable, stacked = self.blocks()[0]
+        names = ((None,) if stacked else ()) + tuple(variable.dimensions)
+        if name not in names:
+            raise Exception('The variable {:s} has not the {:s} '
+                            'dimension.'.format(self.name, name))
+        return names.index(name)
+
+    def iter_chunks(self, axis=0, size=1, prefetch=False):
+        """
+        Yield (data, indexes) pairs that walk the variable reading a chunk at
+        a time, where variable[indexes] is data.
+
+        Keyword arguments:
+        axis -- the position or name of the dimension to walk (default 0)
+        size -- the length of each chunk along the axis (default 1)
+        prefetch -- read the next chunk on a background thread (default
+        False)
+        """
+        return iter_chunks(self, self.axis(axis), size, prefetch)
+
+    @library_locked
+    def read(self, indexes, out=None):
+        """
+        Read only the blocks and hyperslabs covered by the indexes. When the
+        indexes can't be mapped to the blocks it falls back to pack.
+
+        Keyword arguments:
+        indexes -- the indexes of the data to read.
+        out -- an array with the shape of the data, filled in place with
+        each block and returned (default None, allocate a new array).
+        """
+        self.flush()
+        located = self.locate(indexes)
+        if located is None:
+            return fill(out, self.pack().__getitem__(indexes))
+        positions, rest = located
+        offsets, blocks = self.offsets(), self.blocks()
+        if not positions.ndim:
+            member = np.searchsorted(offsets, positions, side='right') - 1
+            variable, stacked = blocks[member]
+            return fill(out, self.record('bytes_read', variable,
+                                         self.read_block(
+                                             variable, stacked,
+                                             int(positions - offsets[member]),
+                                             rest)))
+        runs = group_runs(positions.ravel(), offsets)
+        empty = self.empty(rest)
+        result = check_out(out, positions.shape + empty.shape[1:],
+                           empty.dtype)
+        flat = result.reshape((positions.size,) + empty.shape[1:])
+        if flat.size and not np.may_share_memory(flat, result):
+            raise Exception('The out array should be contiguous.')
+        begin = 0
+        for run, data in zip(runs, self.read_runs(runs, rest)):
+            self.record('bytes_read', blocks[run[0]][0], data)
+            if len(data) != run[3]:
+                raise Exception('The block of {:s} has {:d} positions instead '
+                                'of {:d}.'.format(self.name, len(data),
+                                                  run[3]))
+            flat[begin:begin + run[3]] = data[::-1] if run[2] < 0 else data
+            begin += run[3]
+        return result
+
+    def read_runs(self, runs, rest):
+        """
+        Yield the data of each run in ascending order, reading the files
+        with the pool of the root when there is more than one run. The
+        threads wait for the library lock, so the runs are read in place
+        when the caller already holds it.
+        """
+        blocks = self.blocks()
+        readers = self.root.readers() if self.root and len(runs) > 1 else None
+        read = lambda run: self.read_block(blocks[run[0]][0],
+                                           blocks[run[0]][1],
+                                           run_slice(run)[0], rest)
+        if readers is None or (not self.root.processes and
+                               NETCDF_LOCK.held()):
+            return (read(run) for run in runs)
+        groups = [blocks[run[0]][0].group() for run in runs]
+        if not self.root.processes:
+            def locked(run):
+                with NETCDF_LOCK:
+                    return read(run)
+            return readers.imap(locked, runs)
+        if not self.root.read_only:
+            list(map(lambda g: sync_group(g, self.stats), set(groups)))
+        return readers.imap(read_file_block, [
+            (filepath(group), self.name, blocks[run[0]][1],
+             run_slice(run)[0], rest) for run, group in zip(runs, groups)])
+
+    def chunks(self, indexes=slice(None)):
+        """
+        Yield the data selected by the indexes a file at a time (stacked
+        along the first axis), reading the files with the pool of the root.
+        When the indexes can't be mapped to the files it yields all the data
+        at once.
+        """
+        self.flush()
+        located = self.locate(indexes)
+        if located is None or located[0].ndim != 1:
+            yield self.read(indexes)
+            return
+        positions, rest = located
+        runs = group_runs(positions, self.offsets())
+        if not runs:
+            yield self.empty(rest)
+        blocks = self.blocks()
+        for run, data in zip(runs, self.read_runs(runs, rest)):
+            self.record('bytes_read', blocks[run[0]][0], data)
+            yield data[::-1] if run[2] < 0 else data
+
+    def reduce(self, kind, axis=None, indexes=slice(None), ddof=0):
+        """
+        Reduce the valid values (the ones that aren't fill values) along an
+        axis without packing the variable, merging the moments of each file
+        when it is the first axis. The positions without valid values are
+        NaN (or a count of 0).
+
+        Keyword arguments:
+        kind -- one of 'count', 'sum', 'mean', 'min', 'max', 'var' or 'std'.
+        axis -- the axis to reduce (default None, reduce all the values).
+        indexes -- the hyperslab to reduce (default all the variable).
+        ddof -- the delta degrees of freedom of var and std (default 0).
+        """
+        fills = fill_values(self.blocks()[0][0])
+        merged, parts = None, []
+        for data in self.chunks(indexes):
+            axis = axis if axis is None else axis % max(data.ndim, 1)
+            moments = Moments(data, axis, fills)
+            if axis in [None, 0]:
+                merged = moments if merged is None else merged.merge(moments)
+            else:
+                parts.append(moments.result(kind, ddof))
+        return (np.concatenate(parts) if parts
+                else merged.result(kind, ddof))
+
+    def quantile(self, q, axis=None, indexes=slice(None),
+                 bins=QUANTILE_BINS):
+        """
+        Return the quantiles of the valid values along an axis. Along the
+        first axis (or over all the values) they are approximated by a
+        histogram of each file between the minimum and the maximum (so the
+        data is read twice), with an error below the width of a bin. The
+        histograms of each pixel are built a block of rows at a time, to
+        keep them below HISTOGRAM_BYTES.
+
+        Keyword arguments:
+        q -- a quantile or a sequence of quantiles, between 0 and 1.
+        axis -- the axis to reduce (default None, reduce all the values).
+        indexes -- the hyperslab to reduce (default all the variable).
+        bins -- the amount of bins of each histogram (default 1024).
+        """
+        fills = fill_values(self.blocks()[0][0])
+        bounds, parts = None, []
+        for data in self.chunks(indexes):
+            axis = axis if axis is None else axis % max(data.ndim, 1)
+            if axis in [None, 0]:
+                moments = Moments(data, axis, fills)
+                bounds = moments if bounds is None else bounds.merge(moments)
+            else:
+                parts.append(exact_quantile(data, q, axis, fills))
+        if parts:
+            return np.concatenate(parts, 1 if np.ndim(q) else 0)
+        low, high = [np.nan_to_num(bounds.result(k)) for k in ['min', 'max']]
+        rows = histogram_rows(np.shape(low), bins)
+        blocks = (self.row_blocks(indexes, rows)
+                  if np.ndim(low) and rows < len(low) else None)
+        if blocks is None:
+            return self.sketch(q, axis, indexes, fills, low, high, bins)
+        parts = [self.sketch(q, axis, block, fills, low[i:i + rows],
+                             high[i:i + rows], bins)
+                 for i, block in zip(range(0, len(low), rows), blocks)]
+        return np.concatenate(parts, 1 if np.ndim(q) else 0)
+
+    def sketch(self, q, axis, indexes, fills, low, high, bins):
+        sketch = None
+        for data in self.chunks(indexes):
+            histogram = Histogram(data, axis, fills, low, high, bins)
+            sketch = (histogram if sketch is None
+                      else sketch.merge(histogram))
+        result = [sketch.quantile(v) for v in np.ravel(q)]
+        return np.array(result) if np.ndim(q) else result[0]
+
+    def row_blocks(self, indexes, rows):
+        """
+        Return the indexes split in blocks of rows along the first sliced
+        axis after the first one, or None when they can't be split.
+        """
+        indexes = indexes if isinstance(indexes, tuple) else (indexes,)
+        shape = self.shape
+        indexes += (slice(None),) * (len(shape) - len(indexes))
+        if (len(indexes) != len(shape) or
+                not all(map(is_basic, indexes[1:]))):
+            return None
+        axes = [i for i, index in enumerate(indexes[1:], 1)
+                if not is_integer(index)]
+        if not axes:
+            return None
+        axis = axes[0]
+        step = indexes[axis].indices(shape[axis])[2]
+        positions = np.arange(*indexes[axis].indices(shape[axis]))
+        blocks = []
+        for begin in range(0, len(positions), rows):
+            block = positions[begin:begin + rows]
+            stop = int(block[-1]) + (1 if step > 0 else -1)
+            index = slice(int(block[0]), stop if stop >= 0 else None, step)
+            blocks.append(indexes[:axis] + (index,) + indexes[axis + 1:])
+        return blocks
+
+    def write(self, indexes, changes):
+        """
+        Write only the blocks and hyperslabs covered by the indexes. Return
+        the list of modified members, or None when the indexes can't be
+        mapped to the blocks.
+        """
+        located = self.locate(indexes)
+        if located is None:
+            return None
+        positions, rest = located
+        offsets, blocks = self.offsets(), self.blocks()
+        tail = self.empty(rest).shape[1:]
+        data = np.asarray(changes)
+        if data.shape != positions.shape + tail:
+            data = np.empty(positions.shape + tail, dtype=data.dtype)
+            data[...] = changes
+        if not positions.ndim:
+            member = np.searchsorted(offsets, positions, side='right') - 1
+            variable, stacked = blocks[member]
+            self.write_block(variable, stacked,
+                             int(positions - offsets[member]), rest, data)
+            return [member]
+        data = data.reshape((-1,) + tail)
+        runs = group_runs(positions.ravel(), offsets)
+        begin = 0
+        for run in runs:
+            variable, stacked = blocks[run[0]]
+            index, backwards = run_slice(run)
+            chunk = data[begin:begin + run[3]]
+            self.write_block(variable, stacked, index, rest,
+                             chunk[::-1] if backwards else chunk)
+            begin += run[3]
+        return sorted(set([run[0] for run in runs]))
+
     def __getattr__(self, name):
         print('Unhandled [class: {}, instance: {:s}, attr: {:s}]'.format(
             self.__class__, self.name, name))
@@ -236,10 +1122,29 @@ class NCVariable(object):
 
     def sync(self):
         for variable in self.variables:
-            variable.group().sync()
-
-    def copy_to(self, var):
-        var[:] = self[:]
+            sync_group(variable.group(), self.stats)
+
+    def copy_to(self, var, size=None, progress=None):
+        """
+        Copy the variable into var, reading and writing blocks of a given
+        size along the first axis of var (which can grow), or as many
+        positions as fit in COPY_BYTES. The progress callback receives the
+        amount of copied positions and the total. When the shapes can't be
+        aligned it copies everything at once.
+        """
+        shape, target = self.shape, var.shape
+        extra = len(shape) - len(target)
+        if (extra < 0 or not target or any([n != 1 for n in shape[:extra]])
+                or shape[extra + 1:] != target[1:]):
+            var[:] = self[:]
+            return
+        total = shape[extra]
+        size = size if size else block_length(shape, extra,
+                                              np.dtype(self.dtype).itemsize)
+        for data, index in self.iter_chunks(extra, size):
+            var[index[extra:]] = data.reshape(data.shape[extra:])
+            if progress:
+                progress(index[extra].stop, total)
 
 
 class SingleNCVariable(NCVariable):
@@ -250,37 +1155,185 @@ class SingleNCVariable(NCVariable):
     def pack(self):
         varstmp = self.variables[0]
         if self.variables[0].shape[0] > 1:
-            varstmp = np.vstack([self.variables])
+            with timer(self.stats, 'packs'):
+                varstmp = self.record('bytes_read', varstmp,
+                                      np.vstack([self.variables[:1]]))
         return varstmp
 
+    @property
+    def stacked(self):
+        return self.variables[0].shape[0] > 1
+
+    def obtain_blocks(self):
+        return [(self.variables[0], self.stacked)]
+
+    @library_locked
+    def __getitem__(self, indexes):
+        self.flush()
+        if not self.stacked:
+            return self.record('bytes_read', self.variables[0],
+                               self.source(self.variables[0])[indexes])
+        return self.read(indexes)
+
+    @library_locked
     def __setitem__(self, indexes, changes):
-        return self.variables[0].__setitem__(indexes, changes)
+        self.record('bytes_written', self.variables[0], changes)
+        if self.cache is not None:
+            self.cache.discard(self.variables[0])
+        if self.buffer is None:
+            self.variables[0].__setitem__(indexes, changes)
+        else:
+            self.buffer.add(self.variables[0], indexes, changes)
+        self.changed()
 
 
-class DistributedNCVariable(NCVariable):
+class StaticNCVariable(SingleNCVariable):
+    """
+    A variable of a package without the distributed dimension, which is
+    read from the first file and written into every file.
+    """
 
-    def pack(self):
-        return np.vstack([variable.pack() for variable in self.variables])
+    def __init__(self, name, variables, verify=False):
+        super(StaticNCVariable, self).__init__(name, variables)
+        self.verify = verify
 
-    def __setitem__(self, indexes, change):
-        pack = self.pack()
-        pack.__setitem__(indexes, change)
-        varstmp = np.vsplit(pack, pack.shape[0])
-        if not isinstance(indexes, slice):
-            indexes = tuple(list(indexes)[1:])
-        for i in range(len(varstmp)):
-            self.variables[i][:] = varstmp[i]
-        self.sync()
+    def checksum(self, variable):
+        return hashlib.md5(np.ascontiguousarray(variable[:])).hexdigest()
 
+    def verified(self):
+        if self.verify:
+            checksums = set(map(self.checksum, self.variables))
+            if len(checksums) > 1:
+                raise Exception('The variable {:s} differs between the files '
+                                '(open them with the stacked static mode).'
+                                .format(self.name))
+            self.verify = False
 
-def open(pattern, read_only=False):
+    @library_locked
+    def __getitem__(self, indexes):
+        self.verified()
+        return super(StaticNCVariable, self).__getitem__(indexes)
+
+    @library_locked
+    def read(self, indexes, out=None):
+        self.verified()
+        return super(StaticNCVariable, self).read(indexes, out)
+
+    @library_locked
+    def __setitem__(self, indexes, changes):
+        if self.stacked:
+            # apply the changes over the stacked values and write them all.
+            data = self[:]
+            data[indexes] = changes
+            indexes, changes = slice(None), data[0]
+        for variable in self.variables:
+            self.record('bytes_written', variable, changes)
+            if self.cache is not None:
+                self.cache.discard(variable)
+            if self.buffer is None:
+                variable.__setitem__(indexes, changes)
+            else:
+                self.buffer.add(variable, indexes, changes)
+        self.changed()
+
+
+class DistributedNCVariable(NCVariable):
+
+    def pack(self, out=None):
+        with timer(self.stats, 'packs'):
+            return self.read(slice(None), out)
+
+    def obtain_blocks(self):
+        stacked = lambda v: len(v.shape) == 1 or v.shape[0] > 1
+        return [(v.variables[0], stacked(v.variables[0]))
+                for v in self.variables]
+
+    @library_locked
+    def __getitem__(self, indexes):
+        self.flush()
+        return self.read(indexes)
+
+    def rewrite(self, indexes, change):
+        with timer(self.stats, 'rewrites'):
+            pack = self.pack()
+            pack.__setitem__(indexes, change)
+            varstmp = np.vsplit(pack, pack.shape[0])
+            for i in range(len(varstmp)):
+                self.variables[i][:] = varstmp[i]
+            return range(len(varstmp))
+
+    @library_locked
+    def __setitem__(self, indexes, change):
+        members = self.write(indexes, change)
+        if members is None:
+            self.flush()
+            members = self.rewrite(indexes, change)
+        if self.buffer is None:
+            for i in members:
+                self.variables[i].sync()
+        self.changed()
+
+
+def open(pattern, read_only=False, max_open=None, manifest=None,
+         buffered=False, cache=False, static='shared', mmap=False,
+         readers=None, processes=None, stats=False, concat=None,
+         time_range=None, distributed_dim='time'):
     """
     Return a root descriptor to work with one or multiple NetCDF files.
 
     Keyword arguments:
     pattern -- a list of filenames or a string pattern.
+    read_only -- force to open the files without write access (default False)
+    max_open -- the amount of files kept open at the same time, reopening
+    the least recently used on demand (default None, keep all open)
+    manifest -- a filename to store the description of the files, used to
+    reopen them without reading each file (default None)
+    buffered -- keep the writes in memory until a sync, a close, a read of
+    the written variable or the buffer is full; True or the maximum amount
+    of buffered bytes (default False)
+    cache -- keep the read hyperslabs in memory, evicting the least recently
+    used ones; True or the maximum amount of cached bytes (default False)
+    static -- how to expose the variables of a package without the
+    distributed dimension: 'shared' reads them from the first file,
+    'verified' also checks that every file has the same values on the first
+    read, and 'stacked' stacks the values of every file (default 'shared')
+    mmap -- read the variables of NETCDF3 files as memory mapped views of
+    the files (writable when the files are), instead of copies (default
+    False)
+    readers -- the amount of processes (or threads) used to read the files
+    of a package concurrently (default None)
+    processes -- use processes as readers, which reopen each file in
+    parallel, otherwise use threads, which hold the library lock so their
+    reads are serial and only overlap the copies; the threads see the
+    unsynced writes of the root, so they are kept for writable packages
+    (default None, processes when the files are read only)
+    stats -- count the opens, the bytes read and written of each file, the
+    packs, rewrites, syncs and cache hits into root.stats; True or a Stats
+    instance to share it or to give it hooks (default False)
+    concat -- the dimension (or the dimensions of a mosaic) along which the
+    files of a package are placed side by side, ordered by their coordinate
+    variables, instead of stacking them along the first axis (default None)
+    time_range -- a (start, stop) interval of times (numbers or datetimes,
+    where None is unbounded) to open only the files with times inside it;
+    the time range of each file is cached in the manifest (default None)
+    distributed_dim -- the dimension along which the files of a package are
+    stacked, used to tell the static variables (default 'time')
     """
-    root = NCObject.open(pattern, read_only=read_only)
+    pool = HandlePool(max_open) if max_open or manifest else None
+    manifest = Manifest(manifest) if manifest else None
+    buffer = (WriteBuffer(BUFFER_BYTES if buffered is True else buffered)
+              if buffered else None)
+    cache = (BlockCache(CACHE_BYTES if cache is True else cache)
+             if cache else None)
+    stats = (Stats() if stats is True else stats) if stats else None
+    if cache is not None:
+        cache.observer = stats
+    root = NCObject.open(pattern, read_only=read_only, pool=pool,
+                         manifest=manifest, buffer=buffer, cache=cache,
+                         static=static, mmap=mmap, readers=readers,
+                         processes=processes, stats=stats,
+                         concat=concat, time_range=time_range,
+                         distributed_dim=distributed_dim)
     return root, root.is_new
 
 
@@ -298,7 +1351,7 @@ def getdim(root, name, size=None):
 
 
 def getvar(root, name, vtype='', dimensions=(), digits=0, fill_value=None,
-           source=None):
+           source=None, block_size=None, progress=None, **storage):
     """
     Return a variable from a NCFile or NCPackage instance. If the variable
     doesn't exists create it.
@@ -311,8 +1364,23 @@ def getvar(root, name, vtype='', dimensions=(), digits=0, fill_value=None,
     digits -- the precision required when using a 'f4' vtype (default 0)
     fill_value -- the initial value used in the creation time (default None)
     source -- the source variable to be copied (default None)
+    block_size -- the positions of the first axis copied at once (default
+    None, as many as fit in COPY_BYTES)
+    progress -- a function called with the copied positions and the total
+    after each block is copied (default None)
+
+    Storage arguments (only used when the variable is created):
+    chunksizes -- the chunk length of each dimension (default None)
+    complevel -- the zlib compression level, from 1 to 9 (default 4)
+    shuffle -- apply the HDF5 shuffle filter (default True)
+    fletcher32 -- apply the fletcher32 checksum (default False)
+    contiguous -- store the variable without chunks or compression
+    (default False)
+    access -- derive the chunksizes from the expected access pattern,
+    'spatial-slab' or 'time-series' (default None)
     """
-    return root.getvar(name, vtype, dimensions, digits, fill_value, source)
+    return root.getvar(name, vtype, dimensions, digits, fill_value, source,
+                       block_size, progress, **storage)
 
 
 def sync(root):
@@ -335,21 +1403,57 @@ def close(root):
     root.close()
 
 
-from tailored import tailor
+from tailored import tailor, grid, sel
+from mosaic import Layout, MosaicNCVariable
+from background import open_background
 
 
 @contextmanager
-def loader(pattern, dimensions=None, distributed_dim='time', read_only=False):
+def loader(pattern, dimensions=None, distributed_dim='time', read_only=False,
+           max_open=None, manifest=None, buffered=False, cache=False,
+           static='shared', mmap=False, readers=None, processes=None,
+           stats=False, concat=None, time_range=None):
     """
     It provide a root descriptor to be used inside a with statement. It
     automatically close the root when the with statement finish.
 
     Keyword arguments:
     root -- the root descriptor returned by the 'open' function
+    max_open -- the amount of files kept open at the same time (default None)
+    manifest -- a filename to store the description of the files (default
+    None)
+    buffered -- keep the writes in memory until the root is synced or
+    closed, True or the maximum amount of bytes (default False)
+    cache -- keep the read hyperslabs in memory, True or the maximum amount
+    of bytes (default False)
+    static -- how to expose the variables of a package without the
+    distributed dimension, 'shared', 'verified' or 'stacked' (default
+    'shared')
+    mmap -- read the NETCDF3 files as memory mapped views (default False)
+    readers -- the amount of processes (or threads) used to read the files
+    concurrently (default None)
+    processes -- use processes as readers instead of threads, which read
+    serially (default None, processes when the files are read only)
+    stats -- count the operations into root.stats, True or a Stats instance
+    (default False)
+    concat -- the dimension (or dimensions) along which the files are placed
+    side by side (default None)
+    time_range -- a (start, stop) interval of times to open only the files
+    with times inside it (default None)
     """
     if dimensions:
-        root = tailor(pattern, dimensions, distributed_dim, read_only=read_only)
+        root = tailor(pattern, dimensions, distributed_dim,
+                      read_only=read_only, max_open=max_open,
+                      manifest=manifest, buffered=buffered, cache=cache,
+                      static=static, mmap=mmap, readers=readers,
+                      processes=processes, stats=stats, concat=concat,
+                      time_range=time_range)
     else:
-        root, _ = open(pattern, read_only=read_only)
+        root, _ = open(pattern, read_only=read_only, max_open=max_open,
+                       manifest=manifest, buffered=buffered, cache=cache,
+                       static=static, mmap=mmap, readers=readers,
+                       processes=processes, stats=stats, concat=concat,
+                       time_range=time_range,
+                       distributed_dim=distributed_dim)
     yield root
     root.close()
@@ -0,0 +1,241 @@
+from netCDF4 import Dataset
+from collections import OrderedDict
+from functools import wraps
+from threading import RLock, current_thread
+from stats import timer
+
+
+class LibraryLock(object):
+    """
+    A reentrant lock that knows the thread holding it, so a call made while
+    holding it can run in place instead of waiting for other threads that
+    would need the same lock.
+    """
+
+    def __init__(self):
+        self.lock = RLock()
+        self.owner = None
+        self.depth = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.owner = current_thread()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if not self.depth:
+            self.owner = None
+        self.lock.release()
+        return False
+
+    def held(self):
+        return self.owner is current_thread()
+
+
+# The netCDF library (and the HDF5 library under it) isn't thread safe, so
+# every call made from the threads of a root is serialized with this lock,
+# whatever the format of the file.
+NETCDF_LOCK = LibraryLock()
+
+
+def library_locked(method):
+    """
+    Run the method holding the library lock, so the item accesses of a
+    variable don't run while another thread (like the one prefetching the
+    chunks) is calling the library.
+    """
+    @wraps(method)
+    def locked(*args, **kwargs):
+        with NETCDF_LOCK:
+            return method(*args, **kwargs)
+    return locked
+
+
+class HandlePool(object):
+    """
+    Keep a bounded amount of open datasets, closing the least recently used
+    one when a new dataset should be opened. A pool without size never
+    closes its datasets.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.handles = OrderedDict()
+        self.lock = RLock()
+
+    def acquire(self, handle):
+        with self.lock:
+            if handle in self.handles:
+                self.handles.pop(handle)
+            else:
+                while self.size and len(self.handles) >= self.size:
+                    oldest, _ = self.handles.popitem(last=False)
+                    oldest.release()
+                handle.open()
+            self.handles[handle] = True
+            return handle.dataset
+
+    def discard(self, handle):
+        with self.lock:
+            self.handles.pop(handle, None)
+
+    def __len__(self):
+        return len(self.handles)
+
+
+class DimensionDescriptor(object):
+
+    def __init__(self, size, unlimited):
+        self.size = size
+        self.unlimited = unlimited
+
+    def __len__(self):
+        return self.size
+
+    def isunlimited(self):
+        return self.unlimited
+
+
+class DatasetHandle(object):
+    """
+    Stand in for a netCDF4 Dataset that is only open while it belongs to
+    the pool. When it is closed it keeps the dimension lengths and the
+    variables metadata.
+    """
+
+    def __init__(self, filename, mode, pool, format='NETCDF4',
+                 descriptors=None):
+        self.filename = filename
+        self.mode = mode
+        self.format = format
+        self.pool = pool
+        self.dataset = None
+        self.closed = False
+        self.descriptors = descriptors
+        self.handles = {}
+        if not descriptors:
+            self.pool.acquire(self)
+
+    def open(self):
+        if self.closed:
+            raise RuntimeError('NetCDF: Not a valid ID')
+        self.dataset = Dataset(self.filename, mode=self.mode,
+                               format=self.format)
+        # Reopen the new files without truncating them.
+        self.mode = 'a' if self.mode == 'w' else self.mode
+
+    def release(self):
+        self.describe()
+        self.dataset.close()
+        self.dataset = None
+
+    def describe(self):
+        variables = self.dataset.variables
+        self.descriptors = {
+            'dimensions': {k: DimensionDescriptor(len(d), d.isunlimited())
+                           for k, d in self.dataset.dimensions.items()},
+            'variables': {k: (v.shape, v.dtype, v.dimensions)
+                          for k, v in variables.items()},
+        }
+
+    @property
+    def root(self):
+        return self.pool.acquire(self)
+
+    def getvar(self, name):
+        if name not in self.handles:
+            self.handles[name] = VariableHandle(self, name)
+        return self.handles[name]
+
+    @property
+    def dimensions(self):
+        return (self.root.dimensions if self.dataset
+                else self.descriptors['dimensions'])
+
+    @property
+    def variables(self):
+        names = (self.root.variables.keys() if self.dataset
+                 else self.descriptors['variables'].keys())
+        return {name: self.getvar(name) for name in names}
+
+    def createVariable(self, name, *args, **kwargs):
+        self.root.createVariable(name, *args, **kwargs)
+        return self.getvar(name)
+
+    def sync(self):
+        if self.dataset:
+            self.dataset.sync()
+
+    def close(self):
+        if self.dataset:
+            self.pool.discard(self)
+            self.dataset.close()
+            self.dataset = None
+        elif self.closed:
+            raise RuntimeError('NetCDF: Not a valid ID')
+        self.closed = True
+
+    def __getattr__(self, name):
+        return getattr(self.root, name)
+
+
+class VariableHandle(object):
+    """
+    Stand in for a netCDF4 Variable that reopens its dataset on demand.
+    """
+
+    def __init__(self, handle, name):
+        self.handle = handle
+        self.name = name
+        self.maskandscale = True
+
+    @property
+    def variable(self):
+        variable = self.handle.root.variables[self.name]
+        variable.set_auto_maskandscale(self.maskandscale)
+        return variable
+
+    def set_auto_maskandscale(self, value):
+        self.maskandscale = value
+
+    def group(self):
+        return self.handle
+
+    def metadata(self, position):
+        if self.handle.dataset:
+            live = self.handle.root.variables[self.name]
+            return (live.shape, live.dtype, live.dimensions)[position]
+        return self.handle.descriptors['variables'][self.name][position]
+
+    @property
+    def shape(self):
+        return self.metadata(0)
+
+    @property
+    def dtype(self):
+        return self.metadata(1)
+
+    @property
+    def dimensions(self):
+        return self.metadata(2)
+
+    def __getitem__(self, indexes):
+        return self.variable.__getitem__(indexes)
+
+    def __setitem__(self, indexes, changes):
+        self.variable.__setitem__(indexes, changes)
+
+    def __getattr__(self, name):
+        return getattr(self.variable, name)
+
+
+def filepath(dataset):
+    return (dataset.filename if isinstance(dataset, DatasetHandle)
+            else dataset.filepath())
+
+
+def sync_group(group, stats=None):
+    with timer(stats, 'syncs', file=filepath(group)):
+        group.sync()
@@ -0,0 +1,194 @@
+from netCDF4 import default_fillvals
+import numpy as np
+import warnings
+
+
+REDUCTIONS = ['count', 'sum', 'mean', 'min', 'max', 'var', 'std']
+QUANTILE_BINS = 1024
+HISTOGRAM_BYTES = 2 ** 25
+
+
+def fill_values(variable):
+    """
+    Return the values that mark the missing data of a netCDF variable: its
+    _FillValue (or the default one of the netCDF library) and its
+    missing_value.
+    """
+    attrs = variable.ncattrs()
+    fills = [getattr(variable, a) for a in ['_FillValue', 'missing_value']
+             if a in attrs]
+    dtype = np.dtype(variable.dtype)
+    key = dtype.str[1:]
+    if ('_FillValue' not in attrs and dtype.itemsize > 1 and
+            key in default_fillvals):
+        fills.append(default_fillvals[key])
+    return list(np.ravel(fills))
+
+
+def valid(data, fills):
+    mask = np.ones(np.shape(data), dtype=bool)
+    for fill in fills:
+        mask &= data != fill
+    if data.dtype.kind == 'f':
+        mask &= ~np.isnan(data)
+    return mask
+
+
+def divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b > 0, a / np.maximum(b, 1), np.nan)
+
+
+class Moments(object):
+    """
+    The count, mean, sum of squared deviations (Welford), minimum and
+    maximum of the valid values along an axis, which can be merged with the
+    moments of another chunk of the same axis (Chan et al).
+    """
+
+    def __init__(self, data, axis, fills):
+        data = np.asarray(data)
+        mask = valid(data, fills)
+        values = data.astype('f8')
+        self.count = mask.sum(axis)
+        self.total = np.where(mask, values, 0.).sum(axis)
+        self.mean = divide(self.total, self.count)
+        mean = np.nan_to_num(self.mean)
+        centered = values - (mean if axis is None
+                             else np.expand_dims(mean, axis))
+        self.m2 = np.where(mask, centered ** 2, 0.).sum(axis)
+        self.min = np.where(mask, values, np.inf).min(axis)
+        self.max = np.where(mask, values, -np.inf).max(axis)
+
+    def merge(self, other):
+        count = self.count + other.count
+        delta = np.nan_to_num(other.mean) - np.nan_to_num(self.mean)
+        self.m2 = (self.m2 + other.m2 +
+                   divide(delta ** 2 * self.count * other.count, count))
+        self.m2 = np.nan_to_num(self.m2)
+        self.mean = divide(np.nan_to_num(self.mean) * self.count +
+                           np.nan_to_num(other.mean) * other.count, count)
+        self.total = self.total + other.total
+        self.count = count
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def result(self, kind, ddof=0):
+        if kind == 'count':
+            return self.count
+        if kind == 'sum':
+            return self.total
+        if kind == 'mean':
+            return self.mean
+        if kind == 'min':
+            return np.where(self.count > 0, self.min, np.nan)
+        if kind == 'max':
+            return np.where(self.count > 0, self.max, np.nan)
+        variance = divide(self.m2, self.count - ddof)
+        if kind == 'var':
+            return variance
+        if kind == 'std':
+            return np.sqrt(variance)
+        raise Exception('Unknown reduction {:s} (should be one of {:s}).'
+                        .format(kind, ', '.join(REDUCTIONS)))
+
+
+class Histogram(object):
+    """
+    A mergeable sketch of the valid values along the first axis (or of all
+    the values), that counts them into bins between known bounds to
+    approximate their quantiles.
+    """
+
+    def __init__(self, data, axis, fills, low, high, bins=QUANTILE_BINS):
+        data = np.asarray(data)
+        mask = valid(data, fills)
+        self.low, self.high, self.bins = low, high, bins
+        width = np.where(high > low, high - low, 1.)
+        with np.errstate(invalid='ignore'):
+            position = np.floor((data.astype('f8') - low) / width * bins)
+        position = np.clip(np.nan_to_num(position), 0, bins - 1).astype(int)
+        if axis is None:
+            self.counts = np.bincount(position[mask], minlength=bins)
+            return
+        pixels = int(np.prod(data.shape[1:]))
+        keys = (np.arange(pixels).reshape(data.shape[1:]) * bins +
+                position)
+        self.counts = np.bincount(keys[mask], minlength=pixels * bins)
+        self.counts = self.counts.reshape(data.shape[1:] + (bins,))
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def value(self, cumulative, rank):
+        """
+        Return the approximated value of the sample with an integer rank,
+        spreading the samples of each bin evenly across it.
+        """
+        position = np.minimum((cumulative <= rank[..., np.newaxis]).sum(-1),
+                              self.bins - 1)
+        take = lambda a: np.take_along_axis(
+            a, np.asarray(position)[..., np.newaxis], -1)[..., 0]
+        count = take(self.counts)
+        fraction = divide(rank - take(cumulative) + count + 0.5, count)
+        width = (self.high - self.low) / float(self.bins)
+        return np.clip(self.low + (position + np.nan_to_num(fraction)) *
+                       width, self.low, self.high)
+
+    def quantile(self, q):
+        cumulative = np.cumsum(self.counts, -1)
+        total = cumulative[..., -1]
+        rank = q * np.maximum(total - 1, 0)
+        below, above = np.floor(rank), np.ceil(rank)
+        first = self.value(cumulative, below)
+        value = first + (rank - below) * (self.value(cumulative, above) -
+                                          first)
+        return np.where(total > 0, value, np.nan)
+
+
+def histogram_rows(shape, bins):
+    """
+    Return the amount of rows (positions of the first axis of a result
+    with the given shape) whose histograms fit in HISTOGRAM_BYTES.
+    """
+    pixels = max(int(np.prod(shape[1:])), 1)
+    return max(1, HISTOGRAM_BYTES // (np.dtype(int).itemsize * bins *
+                                      pixels))
+
+
+def exact_quantile(data, q, axis, fills):
+    values = np.where(valid(data, fills), data.astype('f8'), np.nan)
+    with warnings.catch_warnings():
+        # the slices without valid values are NaN.
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanpercentile(values, np.asarray(q) * 100., axis=axis)
+
+
+class Reducible(object):
+    """
+    The reductions of a variable (or a tile), computed by its reduce method
+    over the hyperslab given by the indexes.
+    """
+
+    def count(self, axis=None, indexes=slice(None)):
+        return self.reduce('count', axis, indexes)
+
+    def sum(self, axis=None, indexes=slice(None)):
+        return self.reduce('sum', axis, indexes)
+
+    def mean(self, axis=None, indexes=slice(None)):
+        return self.reduce('mean', axis, indexes)
+
+    def min(self, axis=None, indexes=slice(None)):
+        return self.reduce('min', axis, indexes)
+
+    def max(self, axis=None, indexes=slice(None)):
+        return self.reduce('max', axis, indexes)
+
+    def var(self, axis=None, indexes=slice(None), ddof=0):
+        return self.reduce('var', axis, indexes, ddof)
+
+    def std(self, axis=None, indexes=slice(None), ddof=0):
+        return self.reduce('std', axis, indexes, ddof)
@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+from threading import Lock
+from time import time
+import logging
+
+
+class Stats(object):
+    """
+    Counters and timers of the operations made over a root (and its files),
+    which also notify each measure to the hooks. A hook is called with the
+    kind ('counter' or 'timer'), the name, the value (or the seconds) and
+    the labels of each measure.
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks) if hooks else []
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.timers = {}
+
+    def notify(self, kind, name, value, labels):
+        for hook in self.hooks:
+            hook(kind, name, value, labels)
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        if self.hooks:
+            self.notify('counter', name, value, labels)
+
+    def time(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            calls, total = self.timers.get(key, (0, 0.))
+            self.timers[key] = (calls + 1, total + seconds)
+        if self.hooks:
+            self.notify('timer', name, seconds, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        begin = time()
+        try:
+            yield
+        finally:
+            self.time(name, time() - begin, **labels)
+
+    def select(self, measures, name, labels):
+        labels = set(labels.items())
+        return [v for (n, l), v in list(measures.items())
+                if n == name and labels <= set(l)]
+
+    def counter(self, name, **labels):
+        """
+        Return the sum of a counter over the measures with the given labels.
+        """
+        return sum(self.select(self.counters, name, labels))
+
+    def calls(self, name, **labels):
+        return sum([c for c, _ in self.select(self.timers, name, labels)])
+
+    def seconds(self, name, **labels):
+        return sum([s for _, s in self.select(self.timers, name, labels)])
+
+    def labels(self, name, label):
+        """
+        Return the values of a label used by the measures of a name, like
+        the files of the bytes_read counter.
+        """
+        keys = list(self.counters.keys()) + list(self.timers.keys())
+        return sorted(set([dict(l)[label] for n, l in keys
+                           if n == name and label in dict(l)]))
+
+    def summary(self):
+        """
+        Return a dictionary with the total of each counter and the
+        (calls, seconds) pair of each timer.
+        """
+        result = {}
+        for name in set([n for n, _ in self.counters]):
+            result[name] = self.counter(name)
+        for name in set([n for n, _ in self.timers]):
+            result[name] = (self.calls(name), self.seconds(name))
+        return result
+
+    def openmetrics(self, prefix='netcdf'):
+        """
+        Return the measures as an OpenMetrics text exposition, where each
+        counter is a counter family and each timer is a summary of seconds.
+        """
+        lines = []
+        with self.lock:
+            counters, timers = dict(self.counters), dict(self.timers)
+        for name in sorted(set([n for n, _ in counters])):
+            family = '{:s}_{:s}'.format(prefix, name)
+            lines.append('# TYPE {:s} counter'.format(family))
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append('{:s}_total{:s} {:s}'.format(
+                        family, exposed(labels), repr(value)))
+        for name in sorted(set([n for n, _ in timers])):
+            family = '{:s}_{:s}_seconds'.format(prefix, name)
+            lines.append('# TYPE {:s} summary'.format(family))
+            lines.append('# UNIT {:s} seconds'.format(family))
+            for (n, labels), (calls, total) in sorted(timers.items()):
+                if n == name:
+                    lines.append('{:s}_count{:s} {:d}'.format(
+                        family, exposed(labels), calls))
+                    lines.append('{:s}_sum{:s} {:s}'.format(
+                        family, exposed(labels), repr(total)))
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+
+def exposed(labels):
+    if not labels:
+        return ''
+    escape = lambda v: (str(v).replace('\\', '\\\\').replace('"', '\\"')
+                        .replace('\n', '\\n'))
+    return '{' + ','.join(['{:s}="{:s}"'.format(k, escape(v))
+                           for k, v in labels]) + '}'
+
+
+class Untimed(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+UNTIMED = Untimed()
+
+
+def timer(stats, name, **labels):
+    """
+    Return a context manager that measures a block into the stats, or one
+    that does nothing when there aren't stats.
+    """
+    return UNTIMED if stats is None else stats.timer(name, **labels)
+
+
+def logging_hook(logger=None, level=logging.DEBUG):
+    """
+    Return a hook that logs each measure.
+
+    Keyword arguments:
+    logger -- the logger used (default the netcdf logger).
+    level -- the level of each message (default DEBUG).
+    """
+    logger = logger if logger else logging.getLogger('netcdf')
+    return lambda kind, name, value, labels: logger.log(
+        level, '%s %s %s %s', kind, name, value,
+        ' '.join(['{:s}={:s}'.format(k, str(v))
+                  for k, v in sorted(labels.items())]))
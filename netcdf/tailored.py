@@ -1,82 +1,133 @@
-from netcdf import open as nc_open
+from netcdf import (open as nc_open, iter_chunks, is_integer, check_out,
+                    block_length)
+from reductions import Reducible, QUANTILE_BINS
+from lookup import time_index, spatial_index
+from multiprocessing import Pool
+from collections import deque
+from itertools import product
+import numpy as np
 
 
-class TileAdapter(object):
+def slice_length(index, length):
+    start, stop, step = index.indices(length)
+    return max(0, (stop - start + step + (-1 if step > 0 else 1)) // step)
+
+
+COALESCE_RATIO = 1.5
+
+
+def coalesce(origins, size):
+    """
+    Group the windows that overlap or touch into boxes, returning a list of
+    (start, stop, members) where members are the positions of the windows
+    inside each box. A window joins a box only when the merged box isn't
+    larger than COALESCE_RATIO times the area of its windows, so a diagonal
+    chain of windows isn't read as its whole bounding box.
+    """
+    boxes = []
+    area = np.prod(size)
+    for i in np.lexsort(origins.T[::-1]):
+        start, stop = origins[i], origins[i] + size
+        if boxes:
+            b_start, b_stop, members = boxes[-1]
+            m_start = np.minimum(b_start, start)
+            m_stop = np.maximum(b_stop, stop)
+            if ((start <= b_stop).all() and (b_start <= stop).all() and
+                    np.prod(m_stop - m_start) <=
+                    COALESCE_RATIO * area * (len(members) + 1)):
+                members.append(i)
+                boxes[-1] = (m_start, m_stop, members)
+                continue
+        boxes.append((start, stop, [i]))
+    return boxes
+
+
+class TilePlan(object):
+    """
+    Window geometry of a variable inside a tile (the absolute bounds of each
+    axis), computed once to translate the tile indexes into variable indexes.
+    """
+
+    def __init__(self, adapter):
+        self.shape = adapter.variable.shape
+        names = adapter.dimensions_names()
+        dims = adapter.manager.dimensions
+        limit = lambda n: dims.get(n if n in dims
+                                   else adapter.distributed_dim, [None])
+        self.bounds = [self.bound(slice(*limit(n)), size)
+                       for n, size in zip(names, self.shape)]
+        self.lead = (len(self.bounds) < len(self.shape) and
+                     self.shape[0] == 1)
+        self.checks = [(i + self.lead, lo, hi)
+                       for i, (lo, hi) in enumerate(self.bounds)
+                       if lo and hi]
+
+    def bound(self, limit, size):
+        absolute = lambda n: size + n if n < 0 else n
+        fix = lambda n: min(max(absolute(n), 0), size)
+        return (fix(limit.start if limit.start else 0),
+                fix(limit.stop if limit.stop is not None else size))
+
+    def adjust(self, index, bound):
+        lo, hi = bound
+        start = index.start if index.start else 0
+        stop = index.stop if index.stop else 0
+        return slice(lo + start, lo + stop if stop > 0 else hi + stop,
+                     index.step if index.step else 1)
+
+    def transform(self, indexes):
+        if not isinstance(indexes, (tuple, list)):
+            indexes = (indexes,)
+        indexes = [slice(i, i + 1) if is_integer(i) else i
+                   for i in indexes[:len(self.bounds)]]
+        indexes += [slice(None)] * (len(self.bounds) - len(indexes))
+        result = [self.adjust(i, b) for i, b in zip(indexes, self.bounds)]
+        return tuple(([slice(None)] if self.lead else []) + result)
+
+    def translate(self, indexes):
+        indexes = self.transform(indexes)
+        for i, lo, hi in self.checks:
+            if lo > indexes[i].start or indexes[i].stop > hi:
+                raise Exception('Overflow: Index outside of the tile '
+                                'dimensions.')
+        return indexes
+
+
+class TileAdapter(Reducible):
 
     def __init__(self, manager, variable):
         self.manager = manager
         self.variable = variable
-
-    def normalized_index(self, indexes, names):
-        cls = indexes.__class__
-        answers = {
-            slice: [indexes],
-            list: indexes,
-        }
-        sub_i = (lambda i: slice(i, i + 1, None) if isinstance(i, int) else i)
-        indexes = answers[cls] if cls in answers else map(sub_i, list(indexes))
-        indexes += map(lambda i: slice(None), range(len(names) - len(indexes)))
-        return indexes
+        self._plan = None
 
     @property
     def distributed_dim(self):
         return self.manager.distributed_dim
 
     def dimensions_names(self):
-        dims = {len(v): (k) for k, v in self.variable.dimensions.items()}
-        names = filter(lambda n: n,
-                       map(lambda sh: dims[sh] if sh in dims
-                           else self.distributed_dim,
-                           self.variable.shape))
+        # the names come from the dimensions of the variable (in order), so
+        # the dimensions with the same length aren't confused.
+        variable, stacked = self.variable.blocks()[0]
+        names = (([self.distributed_dim] if stacked else []) +
+                 list(variable.dimensions))
         names = sorted(set(names), key=lambda x: names.index(x))
         return names
 
-    def adjust_index(self, args):
-        to_l = lambda s: [s.start, s.stop, s.step]
-        index, tail_limits, dim_limits = (to_l(args[0]), to_l(args[1]),
-                                          list(args[2]))
-        absolute = lambda n: dim_limits[1] + n if n and n < 0 else n
-        if tail_limits == [None, None, None]:
-            tail_limits = dim_limits + tail_limits[2:]
-        tail_limits = map(absolute, tail_limits)
-        fix = lambda t: (dim_limits[1]
-                         if t > dim_limits[1] else
-                         (dim_limits[0] if t < dim_limits[0] else t))
-        tail_limits = map(fix, tail_limits)
-        index = map(lambda i: i if i else 0, index)
-        index[0] = tail_limits[0] + index[0]
-        index[1] = (tail_limits[0] + index[1]
-                    if index[1] > 0 else tail_limits[1] + index[1])
-        return slice(index[0], index[1], index[2] if index[2] else 1)
+    @property
+    def plan(self):
+        if self._plan is None or self._plan.shape != self.variable.shape:
+            self._plan = TilePlan(self)
+        return self._plan
 
     def transform(self, indexes):
-        names = self.dimensions_names()
-        shapes = list(self.variable.shape)
-        get_slice = lambda n: slice(*self.manager.dimensions.get(n, [None]))
-        limits = map(lambda n: get_slice(n if n in self.manager.dimensions
-                                         else self.distributed_dim), names)
-        var_limits = zip([0] * len(shapes), shapes)
-        related = zip(self.normalized_index(indexes, names),
-                      limits,
-                      var_limits)
-        indexes = map(self.adjust_index, related)
-        # TODO: Adapt index selection.
-        if len(indexes) < len(shapes) and shapes[0] is 1:
-            indexes.insert(0, slice(None))
-        return tuple(indexes)
+        return self.plan.transform(indexes)
 
     def translate(self, indexes):
-        indexes = self.transform(indexes)
-        limits = self.transform(slice(None))
-
-        def outside(args):
-            l, i = args
-            return (l.start and l.stop and
-                    (l.start > i.start or i.stop > l.stop))
-        wrong = filter(outside, zip(limits, indexes))
-        if wrong:
-            raise Exception('Overflow: Index outside of the tile dimensions.')
-        return indexes
+        stats = self.variable.stats
+        if stats is None:
+            return self.plan.translate(indexes)
+        with stats.timer('translations'):
+            return self.plan.translate(indexes)
 
     def __setitem__(self, indexes, changes):
         indexes = self.translate(indexes)
@@ -86,13 +137,83 @@ class TileAdapter(object):
         indexes = self.translate(indexes)
         return self.variable.__getitem__(indexes)
 
+    def read(self, indexes, out=None):
+        """
+        Read the tile indexes into the out array (which should have the shape
+        of the data) when it is given, or into a new array.
+        """
+        return self.variable.read(self.translate(indexes), out)
+
+    def reduce(self, kind, axis=None, indexes=slice(None), ddof=0):
+        """
+        Reduce the valid values of the tile along an axis (see the reduce
+        method of the variables).
+        """
+        return self.variable.reduce(kind, axis, self.translate(indexes),
+                                    ddof)
+
+    def quantile(self, q, axis=None, indexes=slice(None),
+                 bins=QUANTILE_BINS):
+        return self.variable.quantile(q, axis, self.translate(indexes), bins)
+
     @property
     def shape(self):
-        return self[:].shape
+        indexes = self.translate(slice(None))
+        shape = self.variable.shape
+        sizes = [slice_length(i, n) for i, n in zip(indexes, shape)]
+        return tuple(sizes) + shape[len(sizes):]
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
 
-    def copy_to(self, var):
-        indexes = self.transform(slice(None, None, None))
-        var[indexes] = self[:]
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def iter_chunks(self, axis=0, size=1, prefetch=False):
+        """
+        Yield (data, indexes) pairs that walk the tile reading a chunk at a
+        time, where the indexes are relative to the tile.
+        """
+        if not isinstance(axis, int):
+            axis = self.dimensions_names().index(axis)
+        return iter_chunks(self, axis, size, prefetch)
+
+    def windows(self, origins, size, out=None):
+        """
+        Return the windows of a given size placed at each origin, stacked
+        along a new first axis. The origins index the last axes of the tile
+        and the windows that overlap or touch are read together, unless
+        their box would be much larger than the windows (see coalesce).
+
+        Keyword arguments:
+        origins -- a (windows, axes) array with the tile position of each
+        window.
+        size -- the window length along each of those axes.
+        out -- an array filled in place with the windows (default None).
+        """
+        size = np.array(size, dtype=int)
+        origins = np.array(origins, dtype=int).reshape(-1, len(size))
+        head = (slice(None),) * (self.ndim - len(size))
+        result = check_out(out, (len(origins),) + self.shape[:len(head)] +
+                           tuple(size), self.dtype)
+        for start, stop, members in coalesce(origins, size):
+            box = self[head + tuple(map(slice, start, stop))]
+            for i in members:
+                local = map(slice, origins[i] - start,
+                            origins[i] - start + size)
+                result[i] = box[head + tuple(local)]
+        return result
+
+    def copy_to(self, var, size=None, progress=None):
+        total = self.shape[0]
+        size = size if size else block_length(self.shape, 0,
+                                              np.dtype(self.dtype).itemsize)
+        for data, index in self.iter_chunks(0, size):
+            var[self.transform(index)] = data
+            if progress:
+                progress(index[0].stop, total)
 
     def __getattr__(self, name):
         return getattr(self.variable, name)
@@ -101,9 +222,21 @@ class TileAdapter(object):
 class TileManager(object):
 
     def __init__(self, pattern_or_root, dimensions=None,
-                 distributed_dim=None, read_only=False):
+                 distributed_dim=None, read_only=False, max_open=None,
+                 manifest=None, buffered=False, cache=False,
+                 static='shared', mmap=False, readers=None, processes=None,
+                 stats=False, concat=None, time_range=None):
         if pattern_or_root.__class__ in [str, list]:
-            pattern_or_root = nc_open(pattern_or_root, read_only=read_only)[0]
+            pattern_or_root = nc_open(pattern_or_root, read_only=read_only,
+                                      max_open=max_open, manifest=manifest,
+                                      buffered=buffered, cache=cache,
+                                      static=static, mmap=mmap,
+                                      readers=readers,
+                                      processes=processes,
+                                      stats=stats, concat=concat,
+                                      time_range=time_range,
+                                      distributed_dim=(distributed_dim or
+                                                       'time'))[0]
         self.root = pattern_or_root
         self.distributed_dim = distributed_dim
         self.dimensions = dimensions if dimensions else {}
@@ -112,12 +245,125 @@ class TileManager(object):
         var = self.root.getvar(*args, **kwargs)
         return TileAdapter(self, var)
 
+    def windows(self, name, origins, size):
+        return self.getvar(name).windows(origins, size)
+
     def __getattr__(self, name):
         return getattr(self.root, name)
 
 
+class TileGrid(object):
+    """
+    Split the spatial dimensions of a root into a grid of tiles (with an
+    optional halo around each one) that share the same open root.
+    """
+
+    def __init__(self, pattern_or_root, sizes, halo=0,
+                 distributed_dim='time', read_only=False):
+        self.manager = TileManager(pattern_or_root,
+                                   distributed_dim=distributed_dim,
+                                   read_only=read_only)
+        self.root = self.manager.root
+        self.sizes = sizes
+        self.halo = halo
+        self.distributed_dim = distributed_dim
+
+    def tiles(self, name):
+        """
+        Return an (outer, inner) pair of dimension limits for each tile of
+        the variable, where the outer limits include the halo.
+        """
+        dims = self.root.getvar(name).dimensions
+        axes = [[(d, i, min(i + self.sizes[d], len(dims[d])), len(dims[d]))
+                 for i in range(0, len(dims[d]), self.sizes[d])]
+                for d in sorted(self.sizes)]
+        return [({d: [max(i - self.halo, 0), min(j + self.halo, n)]
+                  for d, i, j, n in tile},
+                 {d: [i, j] for d, i, j, _ in tile})
+                for tile in product(*axes)]
+
+    def tile(self, root, dimensions, name):
+        manager = TileManager(root, dimensions=dimensions,
+                              distributed_dim=self.distributed_dim)
+        return manager.getvar(name)
+
+    def map(self, function, name, output_name, output=None, vtype='',
+            workers=None):
+        """
+        Apply the function over each tile of a variable (halo included) and
+        write the result without the halo into the output variable. The
+        tiles are read and written by this process, while the function runs
+        on a pool of processes when there is more than one worker.
+
+        Keyword arguments:
+        function -- a picklable function that receive and return an array
+        with the tile shape.
+        name -- the name of the input variable.
+        output_name -- the name of the output variable, created with the
+        dimensions of the input variable if it doesn't exists.
+        output -- the root descriptor to write into (default the same root).
+        vtype -- the type of the output variable (default the input type).
+        workers -- the amount of processes (default None, run in place).
+        """
+        output = output if output else self.root
+        source = self.root.getvar(name)
+        output.getvar(output_name, vtype if vtype else source.vtype,
+                      tuple(source.blocks()[0][0].dimensions))
+
+        def write(result, tile):
+            outer, inner = tile
+            names = self.tile(self.root, outer, name).dimensions_names()
+            crop = tuple([slice(inner[n][0] - outer[n][0],
+                                inner[n][1] - outer[n][0])
+                          if n in inner else slice(None) for n in names])
+            self.tile(output, inner, output_name)[:] = result[crop]
+        read = lambda tile: self.tile(self.root, tile[0], name)[:]
+        if not workers or workers < 2:
+            for tile in self.tiles(name):
+                write(function(read(tile)), tile)
+            return
+        pool = Pool(workers)
+        pending = deque()
+        try:
+            for tile in self.tiles(name):
+                pending.append((pool.apply_async(function, (read(tile),)),
+                                tile))
+                if len(pending) > 2 * workers:
+                    result, done = pending.popleft()
+                    write(result.get(), done)
+            while pending:
+                result, done = pending.popleft()
+                write(result.get(), done)
+        finally:
+            pool.close()
+            pool.join()
+
+    def __getattr__(self, name):
+        return getattr(self.root, name)
+
+
+def grid(pattern_or_root, sizes, halo=0, distributed_dim='time',
+         read_only=False):
+    """
+    Return a TileGrid to split the root descriptor into tiles and process
+    them in parallel.
+
+    Keyword arguments:
+    pattern_or_root -- a NCObject descriptor or a pattern to open it.
+    sizes -- a dictionary with the tile length of each spatial dimension.
+    halo -- the amount of extra positions around each tile (default 0).
+    distributed_dim -- the dimension kept whole in each tile (default time).
+    read_only -- open the pattern without write access (default False).
+    """
+    return TileGrid(pattern_or_root, sizes, halo=halo,
+                    distributed_dim=distributed_dim, read_only=read_only)
+
+
 def tailor(pattern_or_root, dimensions=None, distributed_dim='time',
-           read_only=False):
+           read_only=False, max_open=None, manifest=None,
+           buffered=False, cache=False, static='shared', mmap=False,
+           readers=None, processes=None, stats=False, concat=None,
+           time_range=None):
     """
     Return a TileManager to wrap the root descriptor and tailor all the
     dimensions to a specified window.
@@ -126,6 +372,79 @@ def tailor(pattern_or_root, dimensions=None, distributed_dim='time',
     root -- a NCObject descriptor.
     pattern -- a filename string to open a NCObject descriptor.
     dimensions -- a dictionary to configurate the dimensions limits.
+    max_open -- the amount of files kept open at the same time (default None).
+    manifest -- a filename to store the description of the files (default
+    None).
+    buffered -- keep the writes in memory until the root is synced or
+    closed (default False).
+    cache -- keep the read hyperslabs in memory (default False).
+    static -- how to expose the variables of a package without the
+    distributed dimension, 'shared', 'verified' or 'stacked' (default
+    'shared').
+    mmap -- read the NETCDF3 files as memory mapped views (default False).
+    readers -- the amount of processes (or threads) used to read the files
+    concurrently (default None).
+    processes -- use processes as readers instead of threads, which read
+    serially (default None, processes when the files are read only).
+    stats -- count the operations into root.stats (default False).
+    concat -- the dimension (or dimensions) along which the files are placed
+    side by side (default None).
+    time_range -- a (start, stop) interval of times to open only the files
+    with times inside it, before applying the time limits (default None).
     """
     return TileManager(pattern_or_root, dimensions=dimensions,
-                       distributed_dim=distributed_dim, read_only=read_only)
+                       distributed_dim=distributed_dim, read_only=read_only,
+                       max_open=max_open, manifest=manifest,
+                       buffered=buffered, cache=cache, static=static,
+                       mmap=mmap, readers=readers, processes=processes,
+                       stats=stats, concat=concat, time_range=time_range)
+
+
+def sel(pattern_or_root, time=None, lat=None, lon=None, **options):
+    """
+    Return a TileManager with the window of the root selected by values of
+    its time, lat and lon variables (instead of indexes), using indexes of
+    those variables that are built once for each root.
+
+    Keyword arguments:
+    pattern_or_root -- a NCObject descriptor or a pattern to open it.
+    time -- a (start, stop) interval of times (numbers or datetimes, where
+    None is unbounded), or a time to select the nearest step (default None,
+    every step).
+    lat -- a (south, north) interval, or a latitude to select the nearest
+    pixel together with lon (default None, every pixel).
+    lon -- a (west, east) interval, or a longitude (default None).
+    options -- the keyword arguments of the 'open' function.
+    """
+    root = (nc_open(pattern_or_root, **options)[0]
+            if pattern_or_root.__class__ in [str, list] else pattern_or_root)
+    dimensions, distributed_dim = {}, 'time'
+    if time is not None:
+        index = root.lookup(('time',), time_index)
+        distributed_dim = index.dimension
+        window = (index.window(*time) if isinstance(time, (tuple, list))
+                  else index.nearest(time))
+        if window[0] == window[1]:
+            raise Exception('There are not times between {:s} and {:s}.'
+                            .format(*map(str, time)))
+        dimensions[distributed_dim] = list(window)
+    if lat is not None or lon is not None:
+        if lat is None or lon is None:
+            raise Exception('The lat and lon should be selected together.')
+        index = root.lookup(('lat', 'lon'), spatial_index)
+        intervals = [isinstance(v, (tuple, list)) for v in [lat, lon]]
+        if all(intervals):
+            windows = index.box(lat, lon)
+            if windows is None:
+                raise Exception('There are not pixels inside the lat {:s} '
+                                'and lon {:s} intervals.'.format(
+                                    str(lat), str(lon)))
+        elif not any(intervals):
+            windows = [(i, i + 1) for i in index.nearest(lat, lon)]
+        else:
+            raise Exception('The lat and lon should be both intervals or '
+                            'both values.')
+        for name, window in zip(index.dimensions, windows):
+            dimensions[name] = list(window)
+    return TileManager(root, dimensions=dimensions,
+                       distributed_dim=distributed_dim)
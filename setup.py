@@ -48,7 +48,7 @@ BINARIES = {
         'name': 'hdf5-{:s}',
         'url': 'http://www.hdfgroup.org/ftp/HDF5/releases/{:s}/src',
         'compile': {
-            'depends': ['pyandoc==0.0.1', 'numpy==1.8.0'],
+            'depends': ['pyandoc==0.0.1', 'numpy==1.16.6'],
             'config': {
                 'pre': '',
                 'post': '--prefix=/usr/local --enable-shared --enable-hl',
@@ -1,5 +1,7 @@
 import tests.base
 from netcdf import netcdf as nc
+from netcdf import reductions
+from datetime import datetime
 import os
 import stat
 import numpy as np
@@ -117,6 +119,79 @@ class TestNetcdf(tests.base.TestCase):
         with self.assertRaisesRegexp(RuntimeError, u'NetCDF: Not a valid ID'):
             nc.close(root)
 
+    def test_open_close_multiple_files_with_open_times(self):
+        # check if time the opens keeping the order of the files.
+        root, is_new = nc.open('unittest0*.nc')
+        self.assertEquals(root.files, ['unittest0%i.nc' % i for i in range(5)])
+        self.assertEquals([r.files[0] for r in root.roots], root.files)
+        self.assertEquals(len(root.open_times), 5)
+        self.assertTrue(root.load_time >= 0)
+        self.assertFalse(is_new)
+        nc.close(root)
+        # check if report the files that can't be opened.
+        with self.assertRaisesRegexp(Exception, u'Unable to open 1 files: '
+                                     'unittest_missing.nc'):
+            nc.open(['unittest00.nc', 'unittest_missing.nc'],
+                    read_only=True)
+
+    def test_open_close_multiple_files_with_max_open(self):
+        # check if the package keeps only a few files open at the same time.
+        root, is_new = nc.open('unittest0*.nc', max_open=2)
+        self.assertEquals(len(root.roots), 5)
+        self.assertEquals(len(root.pool), 2)
+        var = nc.getvar(root, 'data')
+        self.assertEquals(var.shape, (5, 100, 200))
+        self.assertTrue((var[:] == self.data).all())
+        self.assertEquals(len(root.pool), 2)
+        var[1:4, 10:20] = 1.5
+        new = nc.getvar(root, 'new_variable', 'f4', ('time', 'yc', 'xc'),
+                        fill_value=1.0)
+        self.assertTrue((new[:] == 1.0).all())
+        self.assertEquals(len(nc.getdim(root, 'time')), 5)
+        self.assertEquals(len(root.pool), 2)
+        nc.close(root)
+        self.assertEquals(len(root.pool), 0)
+        with self.assertRaisesRegexp(RuntimeError, u'NetCDF: Not a valid ID'):
+            nc.close(root)
+        # check if the changes were saved into the files.
+        with nc.loader('unittest0*.nc') as root:
+            data = nc.getvar(root, 'data')
+            self.assertTrue((data[1:4, 10:20] == 1.5).all())
+            self.assertTrue((data[0] == self.data[0]).all())
+            self.assertIn('new_variable', root.roots[0].roots[0].variables)
+
+    def test_open_close_multiple_files_with_manifest(self):
+        # check if the first open describe the files into the manifest.
+        manifest = 'unittest_manifest.json'
+        if os.path.isfile(manifest):
+            os.remove(manifest)
+        root, is_new = nc.open('unittest0*.nc', manifest=manifest)
+        self.assertTrue(os.path.isfile(manifest))
+        self.assertEquals(len(root.pool), 5)
+        nc.close(root)
+        # check if reopen the package without opening the files.
+        root, is_new = nc.open('unittest0*.nc', manifest=manifest)
+        self.assertEquals(len(root.pool), 0)
+        self.assertFalse(root.read_only)
+        var = nc.getvar(root, 'data')
+        self.assertEquals(var.shape, (5, 100, 200))
+        self.assertEquals(len(nc.getdim(root, 'time')), 5)
+        self.assertEquals(len(root.pool), 0)
+        self.assertTrue((var[2] == self.data[0]).all())
+        self.assertEquals(len(root.pool), 1)
+        var[2] = 1.5
+        nc.close(root)
+        # check if the modified files are described again.
+        os.utime('unittest04.nc', (0, 0))
+        root, is_new = nc.open('unittest0*.nc', manifest=manifest)
+        self.assertEquals(len(root.pool), 1)
+        self.assertEquals(root.roots[4].roots[0].dataset.filepath(),
+                          'unittest04.nc')
+        var = nc.getvar(root, 'data')
+        self.assertTrue((var[2] == 1.5).all())
+        nc.close(root)
+        os.remove(manifest)
+
     def test_open_close_using_with(self):
         # check if open the pattern selection using using a package instance.
         with nc.loader('unittest0*.nc') as root:
@@ -210,6 +285,76 @@ class TestNetcdf(tests.base.TestCase):
         self.assertTrue(are_equals.all())
         nc.close(root)
 
+    def test_iter_chunks(self):
+        # check if the chunks walk the whole variable.
+        root = nc.open('unittest0*.nc')[0]
+        var = nc.getvar(root, 'data')
+        var[:] = np.arange(5 * 100 * 200).reshape(5, 100, 200)
+        for prefetch in [False, True]:
+            chunks = list(var.iter_chunks('time', size=2, prefetch=prefetch))
+            self.assertEquals([i for _, i in chunks],
+                              [(slice(0, 2),), (slice(2, 4),), (slice(4, 5),)])
+            self.assertTrue((np.vstack([c for c, _ in chunks]) ==
+                             var[:]).all())
+        chunks = list(var.iter_chunks(axis=2, size=150))
+        self.assertEquals(chunks[1][1], (slice(None), slice(None),
+                                         slice(150, 200)))
+        self.assertTrue((chunks[1][0] == var[:, :, 150:]).all())
+        with self.assertRaisesRegexp(Exception, u'has not the auditCount'):
+            var.iter_chunks('auditCount')
+        nc.close(root)
+
+    def test_shape_from_metadata(self):
+        # check if the shapes match the packed variables.
+        for pattern in ['unittest00.nc', 'unittest0*.nc']:
+            root = nc.open(pattern)[0]
+            for name in ['data', 'time', 'lat', 'auditTrail']:
+                var = nc.getvar(root, name)
+                self.assertEquals(var.shape, var.pack().shape)
+                self.assertEquals(var.ndim, var.pack().ndim)
+                self.assertEquals(var.size, var.pack().size)
+            nc.close(root)
+        # check if the cached shape is updated when the time grows.
+        root = nc.open('unittest00.nc')[0]
+        data = nc.getvar(root, 'data')
+        time = nc.getvar(root, 'time')
+        self.assertEquals(data.shape, (1, 100, 200))
+        time[1] = 2
+        self.assertEquals(time.shape, (1, 2))
+        self.assertEquals(data.shape, (1, 2, 100, 200))
+        nc.close(root)
+
+    def test_get_non_existing_var_with_storage_options(self):
+        # check if create variables with the chunking and compression options.
+        filename = 'unittest_storage.nc'
+        if os.path.isfile(filename):
+            os.remove(filename)
+        root = nc.open(filename)[0]
+        nc.getdim(root, 'time')
+        nc.getdim(root, 'yc', 1000)
+        nc.getdim(root, 'xc', 2000)
+        dims = ('time', 'yc', 'xc')
+        var = nc.getvar(root, 'slab', 'f4', dims, access='spatial-slab')
+        self.assertEquals(var.variables[0].chunking(), [1, 1000, 2000])
+        var = nc.getvar(root, 'series', 'f4', dims, access='time-series')
+        # the steps of a new time dimension fill the rest of the chunk.
+        self.assertEquals(var.variables[0].chunking(), [66, 63, 63])
+        self.assertEquals(nc.chunk_shape([10000, 1000, 2000],
+                                         [True, False, False], 4,
+                                         'time-series'), (16384, 4, 4))
+        var = nc.getvar(root, 'custom', 'f4', dims, chunksizes=(1, 10, 20),
+                        complevel=9, shuffle=False, fletcher32=True)
+        self.assertEquals(var.variables[0].chunking(), [1, 10, 20])
+        filters = var.variables[0].filters()
+        self.assertEquals(filters['complevel'], 9)
+        self.assertFalse(filters['shuffle'])
+        self.assertTrue(filters['fletcher32'])
+        var = nc.getvar(root, 'plain', 'f4', ('yc', 'xc'), contiguous=True)
+        self.assertEquals(var.variables[0].chunking(), 'contiguous')
+        with self.assertRaisesRegexp(Exception, u'Unknown access pattern'):
+            nc.getvar(root, 'wrong', 'f4', dims, access='random')
+        nc.close(root)
+
     def test_single_file_var_operations(self):
         # check if get and set the numpy matrix.
         root = nc.open('unittest00.nc')[0]
@@ -240,6 +385,442 @@ class TestNetcdf(tests.base.TestCase):
         self.assertTrue(var, tmp + 1)
         nc.close(root)
 
+    def test_multiple_file_var_indexing(self):
+        # check if the index-aware reads match the packed variable.
+        root = nc.open('unittest0*.nc')[0]
+        var = nc.getvar(root, 'data')
+        var[:] = np.arange(5 * 100 * 200).reshape(5, 100, 200)
+        ref = var.pack()
+        indexes = [3, -1, slice(None), slice(1, 4), slice(None, None, 2),
+                   slice(None, None, -1), slice(4, 0, -2), slice(3, 3),
+                   [4, 0, 2], [1, 1], np.array([[0, 1], [3, -2]]),
+                   np.array([True, False, True, False, True]),
+                   (2, 10, 3), (1, slice(10, 50), slice(20, -20)),
+                   (slice(1, 3), 5), (slice(None, None, -2), 20, slice(5))]
+        for index in indexes:
+            self.assertTrue((var[index] == ref[index]).all())
+            self.assertEquals(var[index].shape, ref[index].shape)
+        time = nc.getvar(root, 'time')
+        self.assertEquals(time[1:3].shape, (2, 1))
+        self.assertEquals(time[-1, 0], 1)
+        with self.assertRaises(IndexError):
+            var[5]
+        nc.close(root)
+
+    def test_multiple_file_var_partial_writes(self):
+        # check if the partial writes match the assignment over a numpy copy.
+        root = nc.open('unittest0*.nc')[0]
+        var = nc.getvar(root, 'data')
+        ref = var.pack()
+        changes = [(3, 7.), (-1, np.zeros((100, 200))), (slice(1, 4), 2.),
+                   (slice(None, None, -2), np.arange(3)[:, None, None]),
+                   ([4, 0], 9.), (np.array([[0, 1], [3, -2]]), 5.),
+                   ((2, 10, 3), 8.), ((1, slice(10, 50), slice(20, -20)), 4.),
+                   ((slice(1, 3), 5), np.ones((2, 200)))]
+        for index, change in changes:
+            ref[index] = change
+            var[index] = change
+            self.assertTrue((var[:] == ref).all())
+        nc.close(root)
+        # check if the changes were saved into the files.
+        root = nc.open('unittest0*.nc')[0]
+        var = nc.getvar(root, 'data')
+        self.assertTrue((var[:] == ref).all())
+        var[2, 0, 0] = 11.
+        nc.close(root)
+        with nc.loader('unittest0*.nc') as root:
+            data = nc.getvar(root, 'data')
+            ref[2, 0, 0] = 11.
+            self.assertTrue((data[:] == ref).all())
+
+    def test_buffered_writes(self):
+        # check if the adjacent writes are merged until the flush.
+        root = nc.open('unittest00.nc', buffered=True, stats=True)[0]
+        var = nc.getvar(root, 'data')
+        for i in range(0, 100, 10):
+            var[0, i:i + 10, :] = np.zeros((10, 200)) + i
+        self.assertEquals(len(root.buffer.entries), 1)
+        entry = list(root.buffer.entries.values())[0]
+        self.assertEquals(len(entry), 1)
+        self.assertEquals(entry[0][0], (0, slice(0, 100), slice(None)))
+        # check if keep the dtype of the variable (f4) instead of the float64.
+        self.assertEquals(root.buffer.nbytes, 100 * 200 * 4)
+        self.assertEquals(var[0, 55, 0], 50)
+        self.assertEquals(root.buffer.nbytes, 0)
+        self.assertEquals(root.stats.calls('syncs'), 1)
+        var[0, 0, :] = 3
+        nc.close(root)
+        with nc.loader('unittest00.nc') as root:
+            data = nc.getvar(root, 'data')
+            self.assertEquals(data[0, 0, 0], 3)
+            self.assertEquals(data[0, 99, 0], 90)
+        # check if the partial writes match the assignment over a numpy copy.
+        root = nc.open('unittest0*.nc', buffered=True)[0]
+        var = nc.getvar(root, 'data')
+        ref = var.pack()
+        changes = [(3, 7.), (slice(1, 4), 2.), ([4, 0], 9.),
+                   ((1, slice(10, 50), slice(20, -20)), 4.)]
+        for index, change in changes:
+            ref[index] = change
+            var[index] = change
+        self.assertTrue(root.buffer.entries)
+        nc.sync(root)
+        self.assertFalse(root.buffer.entries)
+        var[2, 0, 0] = 11.
+        ref[2, 0, 0] = 11.
+        nc.close(root)
+        with nc.loader('unittest0*.nc', buffered=1) as root:
+            data = nc.getvar(root, 'data')
+            self.assertTrue((data[:] == ref).all())
+            # check if a full buffer is flushed.
+            data[0] = 1.
+            self.assertFalse(root.buffer.entries)
+
+    def test_cached_reads(self):
+        root = nc.open('unittest0*.nc', cache=True, static='stacked')[0]
+        lat = nc.getvar(root, 'lat')
+        ref = lat[:]
+        self.assertEquals(root.cache.stats['misses'], 5)
+        self.assertEquals(root.cache.stats['hits'], 0)
+        self.assertTrue((nc.getvar(root, 'lat')[:] == ref).all())
+        self.assertTrue((lat.pack() == ref).all())
+        self.assertEquals(root.cache.stats['hits'], 10)
+        self.assertEquals(root.cache.stats['bytes'], ref.nbytes)
+        # check if the cached data can't be modified by the caller.
+        lat[:][0, 0, 0] = -1.
+        self.assertTrue((lat[:] == ref).all())
+        # check if a write discards the cached data of the member.
+        lat[2, 0, 0] = 7.
+        self.assertEquals(root.cache.stats['blocks'], 4)
+        self.assertEquals(lat[2, 0, 0], 7.)
+        nc.close(root)
+        # check if the least recently used blocks are evicted.
+        with nc.loader('unittest00.nc', cache=100000) as root:
+            lat, lon = nc.getvar(root, 'lat'), nc.getvar(root, 'lon')
+            for var in [lat, lon, lat, lat]:
+                var[:]
+            self.assertEquals(root.cache.stats['misses'], 3)
+            self.assertEquals(root.cache.stats['hits'], 1)
+            self.assertEquals(root.cache.stats['blocks'], 1)
+
+    def test_cached_reads_after_growing(self):
+        root = nc.open('grown.nc')[0]
+        nc.getdim(root, 'time')
+        nc.getdim(root, 'xc', 3)
+        nc.getvar(root, 'time', 'i4', ('time',))[0] = 1
+        nc.getvar(root, 'data', 'f4', ('time', 'xc'),
+                  fill_value=-1.)[0] = [1, 2, 3]
+        nc.close(root)
+        with nc.loader('grown.nc', cache=True) as root:
+            data = nc.getvar(root, 'data')
+            self.assertEquals(data[:].tolist(), [[1, 2, 3]])
+            # check if growing the time through other variable isn't hidden
+            # by the cached block.
+            nc.getvar(root, 'time')[1] = 2
+            self.assertEquals(data[:].tolist(), [[[1, 2, 3], [-1, -1, -1]]])
+
+    def test_memory_mapped_reads(self):
+        ref = nc.getvar(nc.open('unittest0*.nc')[0], 'data')[:]
+        with nc.loader('unittest0*.nc', read_only=True, mmap=True) as root:
+            data = nc.getvar(root, 'data')
+            self.assertEquals(data.shape, (5, 100, 200))
+            self.assertFalse(data[1].flags.owndata)
+            self.assertFalse(data[1].flags.writeable)
+            self.assertTrue((data[:] == ref).all())
+        root = nc.open('unittest00.nc', mmap=True)[0]
+        data = nc.getvar(root, 'data')
+        view = data[0]
+        self.assertFalse(view.flags.owndata)
+        self.assertTrue(view.flags.writeable)
+        self.assertTrue((view == ref[0]).all())
+        self.assertTrue((nc.getvar(root, 'lat')[:] == 1.).all())
+        # check if the reads after a write see the changes.
+        data[0, 3, 4] = 9.
+        self.assertEquals(data[0, 3, 4], 9.)
+        # check if the fancy indexes are read by the library.
+        self.assertEquals(data[0, [1, 2], [3, 4]].shape, (2, 2))
+        time = nc.getvar(root, 'time')
+        time[1] = 2
+        self.assertEquals(time.shape, (1, 2))
+        self.assertEquals(list(time[0]), [1, 2])
+        self.assertEquals(data[:].shape, (1, 2, 100, 200))
+        self.assertEquals(data[0, 0, 3, 4], 9.)
+        nc.close(root)
+
+    def test_background_reads(self):
+        root = nc.open_background('unittest0*.nc', workers=3).result()
+        var = root.getvar_task('data').result()
+        ref = var[:]
+        self.assertEquals(var.shape, (5, 100, 200))
+        tasks = [var.read_task(i) for i in range(5)] + [var.read_task([4, 0])]
+        results = [task.result() for task in tasks]
+        for i in range(5):
+            self.assertTrue((results[i] == ref[i]).all())
+        self.assertTrue((results[5] == ref[[4, 0]]).all())
+        chunks = list(var.prefetched_chunks('xc', 150))
+        self.assertEquals(len(chunks), 2)
+        self.assertEquals(chunks[1][1], (slice(None), slice(None),
+                                         slice(150, 200)))
+        self.assertTrue((chunks[1][0] == ref[:, :, 150:]).all())
+        with self.assertRaises(IndexError):
+            var.read_task(10).result()
+        root.close_task().result()
+
+    def test_concurrent_reads(self):
+        root = nc.open('unittest0*.nc')[0]
+        data = nc.getvar(root, 'data')
+        data[:] = np.arange(5 * 100 * 200).reshape(5, 100, 200)
+        ref = data[:]
+        nc.close(root)
+        for processes in [False, True]:
+            with nc.loader('unittest0*.nc', readers=3,
+                           processes=processes) as root:
+                data = nc.getvar(root, 'data')
+                self.assertTrue((data.pack() == ref).all())
+                self.assertTrue((data[::-2] == ref[::-2]).all())
+                self.assertTrue((data[[4, 0], 3] == ref[[4, 0], 3]).all())
+                self.assertEquals(data[3:3].shape, (0, 100, 200))
+                self.assertIsNotNone(root.readers())
+        # check if use processes by default only for read only packages.
+        with nc.loader('unittest0*.nc', readers=3) as root:
+            self.assertFalse(root.processes)
+        with nc.loader('unittest0*.nc', readers=3, read_only=True) as root:
+            self.assertTrue(root.processes)
+            data = nc.getvar(root, 'data')
+            self.assertTrue((data[:] == ref).all())
+
+    def test_readers_holding_the_lock(self):
+        # the new files are NETCDF4, whose library isn't thread safe.
+        ref = np.arange(4 * 10 * 20, dtype='f4').reshape(4, 10, 20)
+        for i in range(4):
+            root = nc.open('locked%d.nc' % i)[0]
+            nc.getdim(root, 'time')
+            nc.getdim(root, 'yc', 10)
+            nc.getdim(root, 'xc', 20)
+            nc.getvar(root, 'data', 'f4', ('time', 'yc', 'xc'))[:] = \
+                ref[i:i + 1]
+            nc.close(root)
+        with nc.loader('locked*.nc', readers=3) as root:
+            data = nc.getvar(root, 'data')
+            chunks = list(data.iter_chunks(0, 2, prefetch=True))
+            self.assertEquals(len(chunks), 2)
+            self.assertTrue((chunks[1][0] == ref[2:]).all())
+            # check if the loop can use the root while prefetching.
+            copy = nc.getvar(root, 'copy', 'f4', ('time', 'yc', 'xc'))
+            for chunk, index in data.iter_chunks(0, 1, prefetch=True):
+                copy[index] = chunk * 2
+                self.assertTrue((copy[index] == chunk * 2).all())
+            self.assertTrue((copy[:] == ref * 2).all())
+        root = nc.open_background('locked*.nc', workers=2, readers=3).result()
+        data = root.getvar_task('data').result()
+        self.assertTrue((data.read_task(slice(None)).result(30) == ref).all())
+        self.assertEquals(len(list(data.prefetched_chunks(0, 3))), 2)
+        root.close_task().result()
+
+    def test_read_into_out(self):
+        root = nc.open('unittest0*.nc')[0]
+        data = nc.getvar(root, 'data')
+        data[:] = np.arange(5 * 100 * 200).reshape(5, 100, 200)
+        ref = data[:]
+        out = np.empty((2, 10, 200), dtype='f8')
+        for step in range(4):
+            result = data.read((slice(step, step + 2), slice(0, 10)), out=out)
+            self.assertIs(result, out)
+            self.assertTrue((out == ref[step:step + 2, :10]).all())
+        point = np.empty(())
+        data.read((1, 2, 3), out=point)
+        self.assertEquals(point, ref[1, 2, 3])
+        fancy = np.empty((2, 2, 100, 200), dtype='f4')
+        data.read(np.array([[0, 1], [3, -2]]), out=fancy)
+        self.assertTrue((fancy == ref[np.array([[0, 1], [3, -2]])]).all())
+        self.assertEquals(data.pack(out=np.empty(ref.shape)).shape, ref.shape)
+        with self.assertRaisesRegexp(Exception, 'should have the shape'):
+            data.read(slice(0, 2), out=np.empty((3, 100, 200)))
+        with self.assertRaisesRegexp(Exception, 'type compatible'):
+            data.read(slice(0, 2), out=np.empty((2, 100, 200), dtype='i4'))
+        nc.close(root)
+
+    def test_stats(self):
+        events = []
+        stats = nc.Stats(hooks=[lambda *event: events.append(event)])
+        root = nc.open('unittest0*.nc', cache=True, stats=stats)[0]
+        self.assertIs(root.stats, stats)
+        self.assertEquals(stats.calls('opens'), 5)
+        self.assertEquals(len(stats.labels('opens', 'file')), 5)
+        data = nc.getvar(root, 'data')
+        ref = data[:]
+        self.assertEquals(stats.counter('bytes_read'), ref.nbytes)
+        self.assertEquals(len(stats.labels('bytes_read', 'file')), 5)
+        self.assertEquals(stats.calls('packs'), 0)
+        data.pack()
+        self.assertEquals(stats.calls('packs'), 1)
+        lat = nc.getvar(root, 'lat')
+        lat[:]
+        lat[:]
+        self.assertEquals(stats.counter('cache_misses'), 6)
+        self.assertEquals(stats.counter('cache_hits'),
+                          root.cache.stats['hits'])
+        self.assertIn(('counter', 'cache_hits', 1, {}), events)
+        data[1] = ref[1]
+        self.assertEquals(stats.counter('bytes_written'), ref[1].nbytes)
+        # check if each write without buffer syncs the written files.
+        self.assertEquals(stats.calls('syncs'), 1)
+        self.assertEquals(stats.labels('syncs', 'file'), ['unittest01.nc'])
+        # check if a write that can't be mapped to the files is a rewrite.
+        data[:, [0, 1]] = 1
+        self.assertEquals(stats.calls('rewrites'), 1)
+        self.assertEquals(stats.calls('packs'), 2)
+        self.assertEquals(stats.calls('syncs'), 6)
+        nc.sync(root)
+        self.assertEquals(stats.calls('syncs'), 11)
+        self.assertEquals(stats.summary()['rewrites'][0], 1)
+        text = stats.openmetrics()
+        self.assertIn('# TYPE netcdf_bytes_read counter', text)
+        self.assertIn('netcdf_packs_seconds_count 2', text)
+        self.assertIn('netcdf_bytes_written_total{file="unittest01.nc"}', text)
+        self.assertTrue(text.endswith('# EOF\n'))
+        nc.close(root)
+        with nc.loader('unittest0*.nc') as root:
+            nc.getvar(root, 'data')[:]
+            self.assertIsNone(root.stats)
+
+    def test_reductions(self):
+        root = nc.open('unittest0*.nc', readers=2)[0]
+        data = nc.getvar(root, 'data')
+        data[:] = np.random.rand(5, 100, 200) + 1
+        # mark a few positions as missing values.
+        data[2, 3:5, 7] = 0.
+        ref = data[:].astype('f8')
+        masked = np.ma.masked_equal(ref, 0.)
+        self.assertEquals(data.count(), masked.count())
+        self.assertEquals(data.count(axis=0)[3, 7], 4)
+        self.assertAlmostEquals(data.sum(), masked.sum(), 3)
+        self.assertTrue(np.allclose(data.mean(axis=0), masked.mean(axis=0)))
+        self.assertTrue(np.allclose(data.var(axis=0, ddof=1),
+                                    masked.var(axis=0, ddof=1)))
+        self.assertTrue(np.allclose(data.std(), masked.std()))
+        self.assertTrue(np.allclose(data.max(axis=-1), masked.max(axis=-1)))
+        self.assertTrue(np.allclose(data.min(axis=1,
+                                             indexes=slice(1, None, 2)),
+                                    masked[1::2].min(axis=1)))
+        self.assertTrue(np.isnan(data.mean(axis=0,
+                                           indexes=(slice(2, 3), 3, 7))))
+        # check if the quantiles are approximated within a bin.
+        width = (masked.max() - masked.min()) / 1024
+        median = np.median(masked.compressed())
+        self.assertLess(abs(data.quantile(0.5) - median), width)
+        quantiles = data.quantile([0.1, 0.9], axis=0, bins=64)
+        expected = np.nanpercentile(masked.filled(np.nan), [10, 90], axis=0)
+        self.assertEquals(quantiles.shape, (2, 100, 200))
+        self.assertLess(abs(quantiles - expected).max(), 2. / 64)
+        self.assertEquals(data.quantile([0.5], axis=2).shape, (1, 5, 100))
+        # check if the histograms split in blocks of rows give the same.
+        hyperslab = (slice(None), slice(90, 3, -4), slice(150))
+        median = data.quantile(0.5, axis=0, indexes=hyperslab, bins=64)
+        budget = reductions.HISTOGRAM_BYTES
+        reductions.HISTOGRAM_BYTES = 64 * 8 * 200 * 7
+        try:
+            self.assertEquals(len(data.row_blocks(slice(None), 7)), 15)
+            self.assertTrue((data.quantile([0.1, 0.9], axis=0, bins=64) ==
+                             quantiles).all())
+            self.assertTrue((data.quantile(0.5, axis=0, indexes=hyperslab,
+                                           bins=64) == median).all())
+        finally:
+            reductions.HISTOGRAM_BYTES = budget
+        with self.assertRaisesRegexp(Exception, 'Unknown reduction'):
+            data.reduce('median')
+        nc.close(root)
+
+    def create_mosaic(self, ref, coordinates=True):
+        # place the tiles in an order different to the filenames.
+        for i, (row, column) in enumerate([(1, 2), (0, 0), (1, 0), (0, 1),
+                                           (1, 1), (0, 2)]):
+            root = nc.open('mosaic%d.nc' % i)[0]
+            nc.getdim(root, 'time')
+            nc.getdim(root, 'yc', 10)
+            nc.getdim(root, 'xc', 20)
+            if coordinates:
+                # the yc coordinate decreases, like a latitude.
+                nc.getvar(root, 'yc', 'f4', ('yc',))[:] = \
+                    -np.arange(10) - row * 10
+                nc.getvar(root, 'xc', 'f4', ('xc',))[:] = \
+                    np.arange(20) + column * 20
+            nc.getvar(root, 'time', 'i4', ('time',))[0] = 1
+            nc.getvar(root, 'data', 'f4', ('time', 'yc', 'xc'),
+                      fill_value=-9.)[:] = \
+                ref[:, row * 10:(row + 1) * 10, column * 20:(column + 1) * 20]
+            nc.close(root)
+
+    def test_mosaic(self):
+        ref = np.arange(20 * 60, dtype='f4').reshape(1, 20, 60)
+        self.create_mosaic(ref)
+        root = nc.open('mosaic*.nc', concat=('yc', 'xc'))[0]
+        data = nc.getvar(root, 'data')
+        self.assertEquals(data.shape, (1, 20, 60))
+        self.assertTrue((data[:] == ref).all())
+        self.assertTrue((data[0, 5:15, 15:45:2] == ref[0, 5:15, 15:45:2])
+                        .all())
+        self.assertTrue((data[0, ::-3, 37] == ref[0, ::-3, 37]).all())
+        self.assertEquals(data[0, 19, 59], ref[0, 19, 59])
+        self.assertTrue((data[0, [1, 12]] == ref[0, [1, 12]]).all())
+        self.assertEquals(len(data.dimensions['xc']), 60)
+        self.assertTrue((nc.getvar(root, 'xc')[:] == np.arange(60)).all())
+        self.assertEquals(nc.getvar(root, 'time').shape, (1,))
+        self.assertEquals(data.mean(), ref.mean())
+        # check if a write touches only the files covered by the indexes.
+        data[0, 8:12, 18:22] = -1
+        ref[0, 8:12, 18:22] = -1
+        self.assertTrue((data[:] == ref).all())
+        nc.close(root)
+        with nc.loader('mosaic3.nc') as tile:
+            self.assertTrue((nc.getvar(tile, 'data')[0, 8:, :2] == -1).all())
+        with nc.loader('mosaic*.nc', dimensions={'xc': [10, 50]},
+                       concat=['yc', 'xc']) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            self.assertEquals(t_data.shape, (1, 20, 40))
+            self.assertTrue((t_data[:] == ref[:, :, 10:50]).all())
+
+    def test_concat_by_filenames(self):
+        ref = np.arange(20 * 60, dtype='f4').reshape(1, 20, 60)
+        self.create_mosaic(ref, coordinates=False)
+        with self.assertRaisesRegexp(Exception, 'needs the yc coordinate'):
+            nc.getvar(nc.open('mosaic*.nc', concat=('yc', 'xc'))[0], 'data')
+        with nc.loader(['mosaic1.nc', 'mosaic3.nc', 'mosaic5.nc'],
+                       concat='xc') as root:
+            data = nc.getvar(root, 'data')
+            self.assertTrue((data[:] == ref[:, :10]).all())
+
+    def test_time_range(self):
+        with nc.loader('unittest0*.nc') as root:
+            nc.getvar(root, 'time')[:] = [[10], [20], [30], [40], [50]]
+        with nc.loader('unittest0*.nc', time_range=(25, 45)) as root:
+            self.assertEquals(root.files, ['unittest02.nc', 'unittest03.nc'])
+            self.assertEquals(nc.getvar(root, 'data').shape, (2, 100, 200))
+        with nc.loader('unittest0*.nc', time_range=(None, 10)) as root:
+            self.assertEquals(root.files, ['unittest00.nc'])
+        with self.assertRaisesRegexp(Exception, 'There are not files'):
+            nc.open('unittest0*.nc', time_range=(51, None))
+        with self.assertRaisesRegexp(Exception, 'has not units'):
+            nc.open('unittest0*.nc', time_range=(datetime(2015, 1, 1), None))
+        # check if the manifest keeps the time range of the pruned files.
+        manifest = 'unittest_manifest.json'
+        with nc.loader('unittest0*.nc', manifest=manifest,
+                       time_range=(40, None)) as root:
+            self.assertEquals(len(root.files), 2)
+        entries = nc.Manifest(manifest).entries
+        self.assertEquals(len(entries), 5)
+        self.assertEquals(sorted([e['time'][:2] for e in entries.values()]),
+                          [[t, t] for t in [10., 20., 30., 40., 50.]])
+        with nc.loader('unittest0*.nc', manifest=manifest,
+                       time_range=(35, None)) as root:
+            self.assertEquals(len(root.files), 2)
+            self.assertEquals(len(root.pool), 0)
+        os.remove(manifest)
+        with nc.loader('unittest0*.nc', dimensions={'time': [1, None]},
+                       time_range=(20, 40)) as t_root:
+            self.assertEquals(nc.getvar(t_root, 'time')[:].ravel().tolist(),
+                              [30, 40])
+
     def test_single_file_new_var_operations(self):
         # check if create a new var.
         root = nc.open('unittest00.nc')[0]
@@ -289,7 +870,7 @@ class TestNetcdf(tests.base.TestCase):
 
     def test_character_variables_in_multiple_file(self):
         # check if get and set the numpy string matrix in multiple files.
-        root = nc.open('unittest0*.nc')[0]
+        root = nc.open('unittest0*.nc', static='stacked')[0]
         var = nc.getvar(root, 'auditTrail')
         self.assertEquals(var.shape, (5, 2, 80))
         result = np.vstack([[self.auditTrail] for i in range(5)])
@@ -300,11 +881,63 @@ class TestNetcdf(tests.base.TestCase):
         self.assertEquals(var, result)
         nc.close(root)
         # check if was writed to each file.
-        root = nc.open('unittest0*.nc')[0]
+        root = nc.open('unittest0*.nc', static='stacked')[0]
         var = nc.getvar(root, 'auditTrail')
         self.assertEquals(var, result)
         nc.close(root)
 
+    def test_static_variables_in_multiple_file(self):
+        # check if the variables without the time are read from one file.
+        root = nc.open('unittest0*.nc')[0]
+        lat = nc.getvar(root, 'lat')
+        self.assertEquals(lat.shape, (1, 100, 200))
+        self.assertTrue((lat[:] == 1.).all())
+        self.assertEquals(nc.getvar(root, 'data').shape, (5, 100, 200))
+        # check if a write changes every file.
+        lat[0, 3, 4] = 8.
+        nc.close(root)
+        root = nc.open('unittest0*.nc', static='stacked')[0]
+        lat = nc.getvar(root, 'lat')
+        self.assertEquals(lat.shape, (5, 100, 200))
+        self.assertTrue((lat[:, 3, 4] == 8.).all())
+        lat[2, 0, 0] = 3.
+        nc.close(root)
+        # check if the verified mode detects the differences.
+        root = nc.open('unittest0*.nc', static='verified')[0]
+        self.assertEquals(nc.getvar(root, 'lon')[0, 0, 0], 1.)
+        with self.assertRaisesRegexp(Exception, u'lat differs between'):
+            nc.getvar(root, 'lat')[:]
+        nc.close(root)
+        with self.assertRaisesRegexp(Exception, u'Unknown static mode'):
+            nc.open('unittest0*.nc', static='split')
+
+    def test_static_with_a_fixed_time(self):
+        # a fixed time dimension is still the distributed dimension.
+        ref = np.arange(4 * 2 * 3, dtype='f4').reshape(4, 2, 3)
+        for i in range(4):
+            root = nc.open('fixed%d.nc' % i)[0]
+            nc.getdim(root, 'time', 1)
+            nc.getdim(root, 'yc', 2)
+            nc.getdim(root, 'xc', 3)
+            nc.getvar(root, 'time', 'i4', ('time',))[:] = i
+            nc.getvar(root, 'data', 'f4', ('time', 'yc', 'xc'))[:] = \
+                ref[i:i + 1]
+            nc.close(root)
+        root = nc.open('fixed*.nc')[0]
+        data = nc.getvar(root, 'data')
+        self.assertEquals(data.shape, (4, 2, 3))
+        self.assertTrue((data[:] == ref).all())
+        data[2] = -1.
+        self.assertEquals(list(nc.getvar(root, 'time')[:].ravel()),
+                          [0, 1, 2, 3])
+        nc.close(root)
+        root = nc.open('fixed0.nc')[0]
+        self.assertTrue((nc.getvar(root, 'data')[:] == ref[:1]).all())
+        nc.close(root)
+        with nc.loader('fixed*.nc', distributed_dim='yc') as root:
+            self.assertEquals(nc.getvar(root, 'data').shape, (4, 2, 3))
+            self.assertEquals(nc.getvar(root, 'time').shape, (1,))
+
     def test_get_var_copy_from_source(self):
         root = nc.open('unittest0*.nc')[0]
         if os.path.isfile('unittest_destiny.nc'):
@@ -329,7 +962,46 @@ class TestNetcdf(tests.base.TestCase):
         self.assertEquals(var_distributed_int.vtype, 'i4')
         diff = var_distributed[:] - var_distributed_int[:]
         self.assertTrue((diff < 1).all())
+        # check if getvar copy into the types without a short name.
+        for vtype in ['i2', 'f8']:
+            var_other = nc.getvar(root_d, 'data_' + vtype, vtype,
+                                  source=var_source)
+            self.assertEquals(var_other.vtype, vtype)
 
 
+    def test_get_var_copy_from_source_by_blocks(self):
+        root = nc.open('unittest0*.nc')[0]
+        if os.path.isfile('unittest_destiny.nc'):
+            os.remove('unittest_destiny.nc')
+        root_d = nc.open('unittest_destiny.nc')[0]
+        # check if getvar copy the source by blocks reporting the progress.
+        var_source = nc.getvar(root, 'data')
+        calls = []
+        progress = lambda done, total: calls.append((done, total))
+        var = nc.getvar(root_d, 'data_copy', source=var_source, block_size=2,
+                        progress=progress)
+        self.assertEquals(calls, [(2, 5), (4, 5), (5, 5)])
+        self.assertEquals(var, var_source)
+        # check if copy a stacked variable into a package by blocks.
+        calls = []
+        var_distributed = nc.getvar(root, 'data_copy', source=var,
+                                    block_size=1, progress=progress)
+        self.assertEquals(calls, [(i, 5) for i in range(1, 6)])
+        # check if the default blocks are as large as the budget allows.
+        if os.path.isfile('unittest_all.nc'):
+            os.remove('unittest_all.nc')
+        root_all = nc.open('unittest_all.nc')[0]
+        calls = []
+        var_all = nc.getvar(root_all, 'data_all', source=var_source,
+                            progress=progress)
+        self.assertEquals(calls, [(5, 5)])
+        self.assertEquals(var_all, var_source)
+        nc.close(root_all)
+        self.assertEquals(nc.block_length((5, 100, 200), 0, 4, 2 ** 17), 1)
+        self.assertEquals(nc.block_length((5, 100, 200), 0, 4, 2 ** 18), 3)
+        self.assertEquals(var, var_distributed)
+        nc.close(root_d)
+        nc.close(root)
+
 if __name__ == '__main__':
         tests.base.main()
@@ -1,8 +1,18 @@
 import tests.base
 import netcdf as nc
+from netcdf.lookup import SpatialIndex
+from netcdf.tailored import coalesce
+from datetime import datetime
+import numpy as np
 import os
 
 
+def smooth(data):
+    result = data.copy()
+    result[:, 1:-1, 1:-1] = (data[:, :-2, 1:-1] + data[:, 2:, 1:-1]) / 2.
+    return result
+
+
 class TestTailored(tests.base.TestCase):
 
     def setUp(self):
@@ -296,6 +306,205 @@ class TestTailored(tests.base.TestCase):
                 t_data[-2:, -10, 161] = 1.5
             self.assertTrue((t_data[:] != 1.5).all())
 
+    def test_iter_chunks(self):
+        dims = self.dimensions
+        with nc.loader('unittest0*.nc', dimensions=dims) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            chunks = list(t_data.iter_chunks('yc', size=15, prefetch=True))
+            self.assertEquals(len(chunks), 3)
+            self.assertEquals(chunks[2][1], (slice(None), slice(30, 40)))
+            self.assertTrue((chunks[2][0] == t_data[:, 30:40]).all())
+            self.assertTrue((np.concatenate([c for c, _ in chunks], axis=1) ==
+                             t_data[:]).all())
+
+    def test_cached_plan(self):
+        root = nc.open('unittest00.nc')[0]
+        t_root = nc.tailor(root, dimensions=self.dimensions)
+        t_data = nc.getvar(t_root, 'data')
+        plan = t_data.plan
+        self.assertTrue((t_data[0, 5:10] == self.data[0, 15:20, 20:-20]).all())
+        self.assertIs(t_data.plan, plan)
+        # check if the plan is rebuilt when the time grows.
+        time = nc.getvar(root, 'time')
+        time[1] = 2
+        self.assertIsNot(t_data.plan, plan)
+        nc.close(t_root)
+
+    def test_open_ended_limits(self):
+        self.dimensions['time'] = [-3, None]
+        with nc.loader('unittest0*.nc', dimensions=self.dimensions) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            data = nc.getvar(t_root.root, 'data')
+            self.assertEquals(t_data.shape, (3, 40, 160))
+            self.assertTrue((t_data[:] == data[2:, 10:50, 20:-20]).all())
+
+    def test_windows(self):
+        with nc.loader('unittest0*.nc', dimensions=self.dimensions) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            origins = [(0, 0), (30, 100), (1, 1), (2, 3), (35, 150)]
+            reads = []
+            read = t_data.variable.__getitem__
+            t_data.variable.__getitem__ = lambda i: reads.append(i) or read(i)
+            windows = t_data.windows(origins, (5, 10))
+            self.assertEquals(windows.shape, (5, 3, 5, 10))
+            self.assertEquals(len(reads), 3)
+            for (y, x), window in zip(origins, windows):
+                self.assertTrue(
+                    (window == t_data[:, y:y + 5, x:x + 10]).all())
+            # check if a diagonal chain of touching windows isn't read as
+            # its whole bounding box.
+            reads[:] = []
+            origins = [(i * 5, i * 10) for i in range(8)]
+            windows = t_data.windows(origins, (5, 10))
+            self.assertEquals(len(reads), 8)
+            for (y, x), window in zip(origins, windows):
+                self.assertTrue(
+                    (window == t_data[:, y:y + 5, x:x + 10]).all())
+            boxes = coalesce(np.array(origins), np.array((5, 10)))
+            self.assertEquals([len(m) for _, _, m in boxes], [1] * 8)
+            # check if the side by side windows are still read together.
+            boxes = coalesce(np.array([(0, 0), (0, 10), (5, 0), (5, 10)]),
+                             np.array((5, 10)))
+            self.assertEquals(len(boxes), 1)
+            self.assertEquals(list(boxes[0][1]), [10, 20])
+            windows = t_root.windows('data', [(0, 0)], (2, 2))
+            self.assertEquals(windows.shape, (1, 3, 2, 2))
+            with self.assertRaisesRegexp(Exception, 'Overflow'):
+                t_data.windows([(38, 0)], (5, 5))
+
+    def test_read_into_out(self):
+        with nc.loader('unittest0*.nc', dimensions=self.dimensions) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            out = np.empty((3, 40, 160), dtype='f4')
+            self.assertIs(t_data.read(slice(None), out=out), out)
+            self.assertTrue((out == t_data[:]).all())
+            windows = np.empty((2, 3, 5, 10))
+            self.assertIs(t_data.windows([(0, 0), (9, 9)], (5, 10), windows),
+                          windows)
+            self.assertTrue((windows[1] == t_data[:, 9:14, 9:19]).all())
+            with self.assertRaisesRegexp(Exception, 'should have the shape'):
+                t_data.read(slice(None), out=np.empty((3, 40, 161)))
+
+    def test_stats(self):
+        with nc.loader('unittest0*.nc', dimensions=self.dimensions,
+                       stats=True) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            t_data[:]
+            t_data[0] = 1
+            self.assertEquals(t_root.stats.calls('translations'), 2)
+            self.assertEquals(t_root.stats.counter('bytes_written'),
+                              40 * 160 * 4)
+
+    def test_reductions(self):
+        with nc.loader('unittest0*.nc', dimensions=self.dimensions) as t_root:
+            t_data = nc.getvar(t_root, 'data')
+            ref = t_data[:].astype('f8')
+            self.assertTrue(np.allclose(t_data.mean(axis=0), ref.mean(0)))
+            self.assertTrue(np.allclose(t_data.max(axis=1), ref.max(1)))
+            self.assertEquals(t_data.count(indexes=(slice(None), 0)),
+                              3 * 160)
+            self.assertLess(abs(t_data.quantile(1.) - ref.max()), 0.01)
+
+    def test_sel(self):
+        root = nc.open('unittest0*.nc')[0]
+        # each file keeps a step, so the time is stacked as (5, 1).
+        nc.getvar(root, 'time')[:] = [[10], [20], [30], [40], [50]]
+        y, x = np.mgrid[:100, :200]
+        lat = -30 - 0.1 * y + 0.01 * x
+        lon = -60 + 0.1 * x + 0.01 * y
+        nc.getvar(root, 'lat')[:] = lat
+        nc.getvar(root, 'lon')[:] = lon
+        t_root = nc.sel(root, time=(20, 40), lat=(-33, -32), lon=(-55, -52))
+        rows, cols = np.nonzero((lat >= -33) & (lat <= -32) &
+                                (lon >= -55) & (lon <= -52))
+        self.assertEquals(t_root.dimensions,
+                          {'time': [1, 4],
+                           'yc': [rows.min(), rows.max() + 1],
+                           'xc': [cols.min(), cols.max() + 1]})
+        t_data = nc.getvar(t_root, 'data')
+        self.assertTrue((t_data[:] == nc.getvar(root, 'data')[
+            1:4, rows.min():rows.max() + 1,
+            cols.min():cols.max() + 1]).all())
+        # select the nearest step and pixel.
+        t_root = nc.sel(root, time=33, lat=-32.51, lon=-57.33)
+        distance = (lat + 32.51) ** 2 + ((lon + 57.33) *
+                                         np.cos(np.radians(-32.51))) ** 2
+        row, col = np.unravel_index(np.argmin(distance), lat.shape)
+        self.assertEquals(t_root.dimensions, {'time': [2, 3],
+                                              'yc': [row, row + 1],
+                                              'xc': [col, col + 1]})
+        self.assertEquals(sorted(root.lookups.keys()),
+                          [('lat', 'lon'), ('time',)])
+        # check if a write drops the index of the variable.
+        nc.getvar(root, 'time')[:] = [[1], [2], [3], [4], [5]]
+        self.assertEquals(list(root.lookups.keys()), [('lat', 'lon')])
+        self.assertEquals(nc.sel(root, time=(4, None)).dimensions,
+                          {'time': [3, 5]})
+        with self.assertRaisesRegexp(Exception, 'There are not times'):
+            nc.sel(root, time=(6, 9))
+        with self.assertRaisesRegexp(Exception, 'There are not pixels'):
+            nc.sel(root, lat=(10, 20), lon=(10, 20))
+        with self.assertRaisesRegexp(Exception, 'has not units'):
+            nc.sel(root, time=datetime(2015, 1, 1))
+        nc.close(root)
+
+    def test_nearest_outside_the_grid(self):
+        random = np.random.RandomState(0)
+        y, x = np.mgrid[0:60, 0:80].astype('f8')
+        lat = -30 + y * 0.5 + x * 0.1 + random.rand(60, 80) * 0.2
+        lon = -70 + x * 0.4 - y * 0.05 + random.rand(60, 80) * 0.2
+        index = SpatialIndex(lat, lon, ('yc', 'xc'))
+        # the points cover the grid and a wide border around it.
+        for _ in range(500):
+            point = (random.uniform(-60, 30), random.uniform(-110, 10))
+            distances = ((lat - point[0]) ** 2 +
+                         ((lon - point[1]) *
+                          np.cos(np.radians(point[0]))) ** 2)
+            expected = np.unravel_index(np.argmin(distances), lat.shape)
+            self.assertEquals(index.nearest(*point), expected)
+
+    def test_grid(self):
+        t_grid = nc.grid('unittest0*.nc', {'yc': 30, 'xc': 70}, halo=1)
+        tiles = t_grid.tiles('data')
+        self.assertEquals(len(tiles), 4 * 3)
+        self.assertEquals(tiles[5], ({'yc': [29, 61], 'xc': [69, 141]},
+                                     {'yc': [30, 60], 'xc': [70, 140]}))
+        data = nc.getvar(t_grid.root, 'data')
+        data[:] = np.arange(5 * 100 * 200).reshape(5, 100, 200)
+        expected = smooth(data[:])
+        for workers in [None, 2]:
+            name = 'smooth_%s' % workers
+            t_grid.map(smooth, 'data', name, workers=workers)
+            result = nc.getvar(t_grid.root, name)
+            self.assertEquals(result.shape, (5, 100, 200))
+            self.assertTrue((result[:] == expected).all())
+        nc.close(t_grid)
+
+    def test_grid_over_a_square(self):
+        # the spatial dimensions have the same length.
+        ref = np.arange(2 * 6 * 6, dtype='f4').reshape(2, 6, 6)
+        for i in range(2):
+            root = nc.open('square%d.nc' % i)[0]
+            nc.getdim(root, 'time')
+            nc.getdim(root, 'yc', 6)
+            nc.getdim(root, 'xc', 6)
+            nc.getvar(root, 'data', 'f4', ('time', 'yc', 'xc'))[:] = \
+                ref[i:i + 1]
+            nc.close(root)
+        t_grid = nc.grid('square*.nc', {'xc': 4, 'yc': 2}, halo=1)
+        self.assertEquals(len(t_grid.tiles('data')), 3 * 2)
+        t_grid.map(smooth, 'data', 'smoothed')
+        result = nc.getvar(t_grid.root, 'smoothed')
+        self.assertTrue((result[:] == smooth(ref)).all())
+        nc.close(t_grid)
+        t_root = nc.tailor('square*.nc', dimensions={'yc': [1, 3]})
+        t_data = nc.getvar(t_root, 'data')
+        self.assertEquals(t_data.shape, (2, 2, 6))
+        chunks = list(t_data.iter_chunks('xc', 4))
+        self.assertEquals(chunks[1][0].shape, (2, 2, 2))
+        self.assertTrue((chunks[1][0] == ref[:, 1:3, 4:]).all())
+        nc.close(t_root)
+
     def test_getvar_with_incomplete_limited_dimensions(self):
         self.dimensions.pop('time', None)
         root = nc.open('unittest0*.nc')[0]